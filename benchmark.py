@@ -0,0 +1,626 @@
+"""热搜 API 性能基准。
+
+用法：python benchmark.py <场景> [...]，不带参数时列出所有场景。
+所有场景只使用仓库自带的数据文件，不访问外网。
+"""
+import base64
+import functools
+import hashlib
+import http.server
+import json
+import os
+import re
+import subprocess
+import tempfile
+import sys
+import threading
+import time
+import tracemalloc
+
+import github_publish
+import hotsearch_api as api
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCHES = {}
+
+
+def bench(func):
+    BENCHES[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def timed(label, func, *args, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<40} {best * 1000:10.2f} ms")
+    return result
+
+
+# ===== 本地 HTTP 服务：用自带的 xlsx 模拟 raw.githubusercontent.com =====
+@functools.cache
+def serve_bundled_files():
+    handler = functools.partial(_QuietHandler, directory=BASE_DIR)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    for p in api.platform_files:
+        api.platform_files[p] = f"{base}/{p}_hotsearch.xlsx"
+    return base
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def reset_cache():
+    api._dataset_cache.clear()
+
+
+def use_local_files():
+    for p in api.platform_files:
+        api.platform_files[p] = os.path.join(BASE_DIR, f"{p}_hotsearch.xlsx")
+
+
+@functools.cache
+def full_corpus():
+    """全部平台、全部工作表拼接后的原始数据（未清洗）。"""
+    use_local_files()
+    entries, errors = api.load_platforms(list(api.platform_files))
+    assert not errors, errors
+    return api.pd.concat([api.read_platform(p, e).assign(平台=p) for p, e in entries.items()],
+                         ignore_index=True)
+
+
+# ===== 对照基线 =====
+# 服务里已经被替换掉的旧实现，只在这里用来对比耗时和校验结果一致
+def parse_excel(blob):
+    """openpyxl 串行读取所有工作表（sheet_name=None）。"""
+    return api.combine_sheets(api.pd.read_excel(api.open_blob(blob), sheet_name=None).values())
+
+
+def fetch_excel(location):
+    blob, _ = api.fetch_source(location)
+    return parse_excel(blob)
+
+
+def top_k(df, k=0):
+    """对筛选结果按热度取前 K（np.partition + 局部排序）。"""
+    return df.iloc[api.top_k_positions(df["热度"].to_numpy(), k)]
+
+
+def load_data(platform, topic=None, period=None):
+    """筛选出的全部行（未按热度排序）。"""
+    dataset, errors = api._dataset_for(platform, period)
+    rows = dataset.select_rows(platform, api.TopicQuery.parse(topic), period)
+    df = dataset.frame(platform) if rows is None else dataset.combined.iloc[rows]
+    return df, errors
+
+
+def query_top(platform, topic=None, limit=0, period=None):
+    df, errors, _ = api.query_page(platform, topic, limit, period=period)
+    return df, errors
+
+
+# ===== 场景 =====
+@bench
+def bench_load():
+    """全部平台：串行下载+解析 vs 线程下载 / 进程解析。"""
+    serve_bundled_files()
+    api.get_parse_pool()  # 预热进程池，不计入耗时
+
+    def serial():
+        return {p: fetch_excel(url) for p, url in api.platform_files.items()}
+
+    def parallel():
+        reset_cache()
+        entries, errors = api.load_platforms(list(api.platform_files))
+        assert not errors, errors
+        return {p: api.read_platform(p, e) for p, e in entries.items()}
+
+    a = timed("serial fetch_excel x3", serial)
+    b = timed("parallel load_platforms", parallel)
+    # 快照只保留 USECOLS 列，比较行数
+    assert all(len(a[p]) == len(b[p]) for p in a)
+
+
+@bench
+def bench_source():
+    """冷加载全部平台：本地 HTTP 镜像下载 vs 本地文件 mmap。"""
+    base = serve_bundled_files()
+    api.get_parse_pool()
+    layouts = {
+        "http mirror": {p: f"{base}/{p}_hotsearch.xlsx" for p in api.platform_files},
+        "local mmap": {p: os.path.join(BASE_DIR, f"{p}_hotsearch.xlsx") for p in api.platform_files},
+    }
+
+    def cold_load():
+        reset_cache()
+        entries, errors = api.load_platforms(list(api.platform_files))
+        assert not errors, errors
+        return entries
+
+    for label, files in layouts.items():
+        api.platform_files.update(files)
+        cold_load()  # 第一次可能需要生成快照
+        timed(f"load_platforms ({label})", cold_load, repeat=3)
+
+
+@bench
+def bench_sheets():
+    """单个工作簿：串行读取全部工作表 vs 每表一个进程。"""
+    with open(os.path.join(BASE_DIR, "weibo_hotsearch.xlsx"), "rb") as f:
+        content = f.read()
+    api.get_parse_pool()
+
+    a = timed("parse_excel (serial, all sheets)", parse_excel, content)
+    b = timed("parse_workbook (per-sheet processes)", api.parse_workbook, content)
+    assert len(a) == len(b), (a.shape, b.shape)
+    print(f"rows={len(b)} columns={list(b.columns)}")
+
+
+@bench
+def bench_memory():
+    """单个工作簿：openpyxl 与流式读取的 tracemalloc 峰值内存和耗时。"""
+    with open(os.path.join(BASE_DIR, "weibo_hotsearch.xlsx"), "rb") as f:
+        content = f.read()
+
+    for label, func in [("pd.read_excel (openpyxl)", parse_excel),
+                        ("xlsx_stream.read_xlsx", api.read_workbook)]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        df = func(content)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<40} {elapsed * 1000:10.2f} ms  peak={peak / 2**20:8.1f} MiB  rows={len(df)}")
+        del df
+
+
+@bench
+def bench_heat():
+    """热度清洗：逐行 apply(clean_hot_value) vs 向量化 clean_hot_values。"""
+    df = full_corpus()
+    print(f"rows={len(df)}")
+    a = timed("apply(clean_hot_value)", lambda: df["热度"].apply(api.clean_hot_value), repeat=3)
+    b = timed("clean_hot_values", lambda: api.clean_hot_values(df["热度"]), repeat=3)
+    assert (a.astype(float).to_numpy() == b.to_numpy()).all()
+    timed("heat_values (含原始数值回填)", api.heat_values, df, repeat=3)
+
+
+TOPICS = ["王", "中国", "王星", "哪吒2", "春晚", "官宣", "iPhone", "a", "不存在的话题xyz"]
+
+
+@bench
+def bench_topic():
+    """话题筛选：逐行 str.contains vs 标题 bigram 倒排索引（全部工作表）。"""
+    use_local_files()
+    dataset = api.get_dataset()
+    titles = dataset.combined["标题"]
+    print(f"rows={len(titles)} unique_titles={len(dataset.index.titles)}")
+    timed("TitleIndex build", api.TitleIndex, titles)
+
+    for topic in TOPICS:
+        a = timed(f"str.contains {topic!r}",
+                  lambda: titles.str.contains(topic, case=False, na=False, regex=False).to_numpy().nonzero()[0],
+                  repeat=3)
+        b = timed(f"index.search {topic!r} ({len(a)} hits)", dataset.index.search, topic, repeat=3)
+        assert (a == b).all() and len(a) == len(b), topic
+
+
+QUERIES = [
+    {"and": ["王", "星"]},
+    {"or": ["春晚", "哪吒", "官宣"]},
+    {"and": ["王"], "not": ["王星"]},
+    {"regex": "^王.{2}$"},
+]
+
+
+@bench
+def bench_query():
+    """组合查询：每个关键词一次 str.contains vs 索引候选 + 单遍核对。"""
+    use_local_files()
+    dataset = api.get_dataset()
+    titles = dataset.combined["标题"]
+
+    def per_keyword(spec):
+        mask = api.pd.Series(True, index=titles.index)
+        for term in spec.get("and", []):
+            mask &= titles.str.contains(term, case=False, regex=False)
+        if spec.get("or"):
+            any_mask = api.pd.Series(False, index=titles.index)
+            for term in spec["or"]:
+                any_mask |= titles.str.contains(term, case=False, regex=False)
+            mask &= any_mask
+        for term in spec.get("not", []):
+            mask &= ~titles.str.contains(term, case=False, regex=False)
+        if spec.get("regex"):
+            mask &= titles.str.contains(spec["regex"], case=False, regex=True)
+        return mask.to_numpy().nonzero()[0]
+
+    for spec in QUERIES:
+        query = api.TopicQuery.parse(spec)
+        scans = sum(1 if isinstance(v, str) else len(v) for v in spec.values())
+        a = timed(f"str.contains x{scans} {spec}", per_keyword, spec)
+        b = timed(f"index.search ({len(a)} hits)", dataset.index.search, query)
+        assert len(a) == len(b) and (a == b).all(), spec
+
+
+@bench
+def bench_topk():
+    """按热度取前 K：sort_values + head vs top_k（不同 N、K）。"""
+    use_local_files()
+    combined = api.get_dataset().combined
+    for n in (10_000, 100_000, len(combined)):
+        df = combined.iloc[:n]
+        for k in (10, 100, 1_000, 10_000):
+            a = timed(f"sort_values+head N={n} K={k}",
+                      lambda: df.sort_values("热度", ascending=False, kind="stable").head(k), repeat=3)
+            b = timed(f"top_k           N={n} K={k}", top_k, df, k, repeat=3)
+            assert (a.index == b.index).all()
+
+
+@bench
+def bench_presorted():
+    """前 N 条：筛选后 top_k vs 沿预排热度序列取（各平台 / 话题 / N）。"""
+    use_local_files()
+    api.get_dataset()
+    cases = [("all", None, 10), ("weibo", None, 100), ("all", None, 0),
+             ("all", "王", 10), ("baidu", "中国", 50), ("all", "王星", 10),
+             ("all", {"not": ["王"]}, 10), ("toutiao", "a", 0)]
+    for platform, topic, limit in cases:
+        def baseline():
+            df, _ = load_data(platform, topic)
+            return top_k(df, limit)
+
+        label = f"{platform} {topic!r} N={limit}"
+        a = timed(f"load_data+top_k {label}", baseline, repeat=3)
+        b = timed(f"query_top       {label}", lambda: query_top(platform, topic, limit)[0], repeat=3)
+        assert (a.index == b.index).all(), label
+
+
+@bench
+def bench_paging():
+    """翻页：每页按 offset 重新取前 offset+N 条 vs 游标定位。"""
+    use_local_files()
+    api.get_dataset()
+    for platform, topic, page in [("all", None, 100), ("all", "王", 100), ("weibo", "中国", 50)]:
+        pages = 50
+
+        def by_offset():
+            out = []
+            for i in range(pages):
+                df, _ = query_top(platform, topic, (i + 1) * page)
+                out.append(df.iloc[i * page:])
+            return out
+
+        def by_cursor():
+            out, cursor = [], None
+            for _ in range(pages):
+                df, _, cursor = api.query_page(platform, topic, page, cursor)
+                out.append(df)
+            return out
+
+        label = f"{platform} {topic!r} {pages}x{page}"
+        a = timed(f"offset {label}", by_offset)
+        b = timed(f"cursor {label}", by_cursor)
+        assert all((x.index == y.index).all() for x, y in zip(a, b)), label
+
+
+@bench
+def bench_timerange():
+    """时间范围：布尔掩码扫描整列 vs 按平台排好序的时间列二分。"""
+    use_local_files()
+    dataset = api.get_dataset()
+    times = dataset.combined["时间"]
+    periods = [("2025-03-01", "2025-03-05", None), ("2025-06-01", None, None),
+               (None, None, "24h"), (None, None, "7d"), (None, None, "30d")]
+    for start, end, time_period in periods:
+        period = api.TimeRange.parse(start, end, time_period)
+        lo, hi = period.bounds(dataset.latest)
+
+        def scan():
+            mask = times.notna()
+            if lo is not None:
+                mask &= times >= lo
+            if hi is not None:
+                mask &= times < hi
+            return mask.to_numpy().nonzero()[0]
+
+        label = f"{start}~{end} {time_period}"
+        a = timed(f"mask scan   {label}", scan, repeat=3)
+        b = timed(f"searchsorted {label} ({len(a)} rows)", dataset.time_rows, "all", lo, hi, repeat=3)
+        assert (a == b).all(), label
+
+
+@bench
+def bench_partitions():
+    """快照读取：全部分区 vs 按时间范围裁剪分区（weibo）。"""
+    use_local_files()
+    api.get_dataset()  # 确保快照已生成
+    ranges = [(None, None), ("2025-10-01", None), ("2025-10-25", None), ("2025-03-01", "2025-03-08")]
+    for start, end in ranges:
+        df = timed(f"read_snapshot {start}~{end}", api.snapshot.read_snapshot,
+                   "weibo", api.USECOLS, start, end, repeat=3)
+        print(f"  rows={len(df)}")
+
+
+@bench
+def bench_export():
+    """全量导出：内存中构建 zip vs 流式 zip（耗时与 tracemalloc 峰值）。"""
+    use_local_files()
+    dataset = api.get_dataset()
+    rows = dataset.heat_order["all"]
+
+    def in_memory():
+        df = dataset.combined.iloc[rows]
+        buffer = api.BytesIO()
+        with api.zipfile.ZipFile(buffer, "w", api.zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("hotsearch.csv", df.to_csv(index=False).encode("utf-8-sig"))
+        return len(buffer.getvalue())
+
+    def streaming():
+        return sum(len(chunk) for chunk in api.exporters.stream_csv_zip(dataset.combined, rows))
+
+    for label, func in [("in-memory zip", in_memory), ("stream_csv_zip", streaming)]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<40} {elapsed * 1000:10.2f} ms  peak={peak / 2**20:8.1f} MiB  size={size}")
+
+
+@bench
+def bench_formats():
+    """各导出格式的生成耗时与大小（全部行 / 只投影两列）。"""
+    use_local_files()
+    dataset = api.get_dataset()
+    rows = dataset.heat_order["all"]
+    for columns in (None, ["标题", "热度"]):
+        for fmt in api.exporters.EXPORT_FORMATS:
+            _, _, stream = api.exporters.stream_export(fmt, dataset.combined, rows, columns)
+            t0 = time.perf_counter()
+            size = sum(len(chunk) for chunk in stream)
+            elapsed = time.perf_counter() - t0
+            print(f"{fmt:<8} columns={columns}  {elapsed * 1000:10.2f} ms  size={size}")
+
+
+@bench
+def bench_exportcache():
+    """重复导出：每次重新生成 vs 从 exports/ 缓存发送文件。"""
+    use_local_files()
+    api.get_dataset()
+    client = api.app.test_client()
+    payload = {"platform": "all", "topic": "王", "format": "csv"}
+
+    def download():
+        return len(client.post("/download", json=payload).get_data())
+
+    cache = api.EXPORT_CACHE
+    api.EXPORT_CACHE = api.exporters.ExportCache(cache.directory, 0)
+    timed("regenerate every time", download, repeat=3)
+    api.EXPORT_CACHE = cache
+    download()  # 生成并写入缓存
+    timed("served from exports/", download, repeat=3)
+
+
+@bench
+def bench_burst():
+    """冷启动时 8 个并发请求加载同一平台：各自加载 vs single-flight 合并。"""
+    use_local_files()
+    api.get_parse_pool()
+
+    def burst(load):
+        reset_cache()
+        threads = [threading.Thread(target=load, args=("weibo",)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    for label, load in [("independent loads", api._load_platform),
+                        ("single-flight", api.load_platform)]:
+        before = dict(api.CACHE_STATS)
+        timed(f"{label} x8", burst, load)
+        print(f"  parses={api.CACHE_STATS['miss'] - before['miss']} {api._load_flight.stats}")
+
+
+@bench
+def bench_analyze():
+    """/analyze 重复请求：关闭结果缓存 vs 开启结果缓存。"""
+    use_local_files()
+    api.get_dataset()
+    client = api.app.test_client()
+    payloads = [{"platform": p, "topic": t, "time_period": "最近一周"}
+                for p in ("all", "weibo") for t in ("", "王", {"or": ["春晚", "哪吒"]})]
+
+    def replay():
+        for payload in payloads * 20:
+            assert "error" not in client.post("/analyze", json=payload).get_json()
+
+    cache = api.RESULT_CACHE
+    api.RESULT_CACHE = api.ResultCache(0, 0)
+    timed(f"no cache  x{len(payloads) * 20}", replay, repeat=3)
+    api.RESULT_CACHE = cache
+    cache.clear()
+    timed(f"cached    x{len(payloads) * 20}", replay, repeat=3)
+    print(cache.snapshot_stats())
+
+
+# ===== 本地模拟的 GitHub Git Data API =====
+class FakeGitHub(http.server.BaseHTTPRequestHandler):
+    """只实现 publish 用到的几个接口；树用 {路径: blob SHA} 的扁平结构表示。"""
+
+    blobs, trees, commits, refs = {}, {}, {}, {}
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def _route(self):
+        path = self.path.split("?")[0]
+        self.requests_seen.append(f"{self.command} {path.split('/git/')[-1]}")
+        return re.sub(r"^/repos/[^/]+/[^/]+/git/", "", path)
+
+    def do_GET(self):
+        route = self._route()
+        if route.startswith("ref/heads/"):
+            return self._reply({"object": {"sha": self.refs[route[len("ref/heads/"):]]}})
+        if route.startswith("commits/"):
+            return self._reply({"tree": {"sha": self.commits[route[len("commits/"):]]["tree"]}})
+        if route.startswith("trees/"):
+            tree = self.trees[route[len("trees/"):]]
+            return self._reply({"tree": [{"path": p, "type": "blob", "sha": s} for p, s in tree.items()]})
+        self._reply({"message": "Not Found"}, 404)
+
+    def do_POST(self):
+        route, data = self._route(), self._body()
+        if route == "blobs":
+            content = base64.b64decode(data["content"])
+            sha = hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+            self.blobs[sha] = content
+            return self._reply({"sha": sha}, 201)
+        if route == "trees":
+            tree = dict(self.trees[data["base_tree"]])
+            tree.update({e["path"]: e["sha"] for e in data["tree"]})
+            sha = hashlib.sha1(json.dumps(sorted(tree.items())).encode()).hexdigest()
+            self.trees[sha] = tree
+            return self._reply({"sha": sha}, 201)
+        if route == "commits":
+            sha = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+            self.commits[sha] = data
+            return self._reply({"sha": sha}, 201)
+        self._reply({"message": "Not Found"}, 404)
+
+    def do_PATCH(self):
+        route, data = self._route(), self._body()
+        self.refs[route[len("refs/heads/"):]] = data["sha"]
+        self._reply({"object": {"sha": data["sha"]}})
+
+
+@functools.cache
+def serve_fake_github():
+    FakeGitHub.trees["t0"] = {}
+    FakeGitHub.commits["c0"] = {"tree": "t0", "parents": []}
+    FakeGitHub.refs["main"] = "c0"
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@bench
+def bench_publish():
+    """发布导出文件：contents API 逐个提交的请求数 vs Git Data API 批量提交（本地模拟服务）。"""
+    api.GITHUB_API_BASE = serve_fake_github()
+    directory = tempfile.mkdtemp()
+    paths = []
+    for i in range(8):
+        path = os.path.join(directory, f"export-{i}.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(2**20 * (i + 1)))
+        paths.append(path)
+
+    def publish():
+        FakeGitHub.requests_seen.clear()
+        _, result = api.publish_exports(paths)
+        return result
+
+    result = timed("publish 8 files (36 MiB)", publish)
+    print(f"  uploaded={len(result['uploaded'])} requests={len(FakeGitHub.requests_seen)} "
+          f"(contents API: {len(paths)} PUT, {len(paths)} commits)")
+    with open(paths[0], "wb") as f:
+        f.write(b"changed")
+    result = timed("republish, 1 file changed", publish)
+    print(f"  uploaded={result['uploaded']} skipped={len(result['skipped'])} "
+          f"requests={FakeGitHub.requests_seen}")
+    head = FakeGitHub.commits[FakeGitHub.refs["main"]]
+    tree = FakeGitHub.trees[head["tree"]]
+    assert all(tree[f"exports/{os.path.basename(p)}"] == github_publish.git_blob_sha(p) for p in paths)
+    result = timed("republish, nothing changed", publish)
+    assert result["commit"] is None
+
+
+# 子进程里模拟一个 worker：自己构建数据集或映射共享存储，跑几个查询后报告私有内存
+_WORKER = """
+import re, sys, time
+import hotsearch_api as api
+t0 = time.perf_counter()
+ds = api.build_dataset(None) if sys.argv[1] == "build" else api.Dataset.from_store(sys.argv[1])
+ready = time.perf_counter() - t0
+for topic in ("中国", "王", None):
+    rows = ds.select_rows(None, topic, api.TimeRange.parse(None, None, None))
+    ds.combined.iloc[ds.top_rows(None, 1000, rows, None)].to_dict("records")
+status = open("/proc/self/status").read()
+print(ready, *(int(re.search(k + r":\\s+(\\d+)", status).group(1)) for k in ("RssAnon", "RssFile")))
+"""
+
+
+@bench
+def bench_shared():
+    """4 个 worker 进程：各自构建数据集 vs 映射同一份共享存储（就绪耗时与私有/共享内存，Linux）。"""
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, DATA_SOURCE="local", DATASET_STORE_DIR=directory, PYTHONPATH=BASE_DIR)
+    use_local_files()
+    api.dataset_store.STORE_DIR = directory
+    dataset = api.publish_dataset(api.build_dataset(None))
+
+    for label, arg in [("build per worker", "build"), ("map shared store", dataset.store_name)]:
+        workers = [subprocess.Popen([sys.executable, "-c", _WORKER, arg], env=env, cwd=BASE_DIR,
+                                    stdout=subprocess.PIPE, text=True) for _ in range(4)]
+        results = [tuple(map(float, w.communicate()[0].split())) for w in workers]
+        ready = max(r[0] for r in results)
+        anon = sum(r[1] for r in results) / 1024
+        print(f"{label:<40} ready={ready * 1000:8.1f} ms  private={anon:7.1f} MiB  "
+              f"file-backed={results[0][2] / 1024:6.1f} MiB/worker")
+
+
+_BOOT = """
+import time
+t0 = time.perf_counter()
+import hotsearch_api as api
+api.warm_start() or api.get_dataset()
+print(time.perf_counter() - t0)
+"""
+
+
+@bench
+def bench_coldstart():
+    """进程启动到数据集可用：没有持久化版本（下载解析构建）vs 映射上次发布的版本。"""
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, DATA_SOURCE="local", DATASET_STORE_DIR=directory, PYTHONPATH=BASE_DIR)
+    for label in ("empty store", "persisted store"):
+        out = subprocess.run([sys.executable, "-c", _BOOT], env=env, cwd=BASE_DIR,
+                             stdout=subprocess.PIPE, text=True, check=True).stdout
+        print(f"{label:<40} {float(out) * 1000:10.2f} ms")
+
+
+def main(argv):
+    if not argv or argv[0] not in BENCHES:
+        for name, func in BENCHES.items():
+            print(f"{name:<12} {func.__doc__}")
+        return
+    for name in argv:
+        print(f"--- {name}")
+        BENCHES[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,21 @@
+"""测试环境：读取仓库自带的工作簿；快照、导出缓存和共享数据集都写到临时目录，
+不改动工作区里的 snapshots/、exports/、dataset_store/。
+
+这些路径在 import hotsearch_api 时读取，所以在收集任何测试模块之前设置。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="hotsearch-test-")
+atexit.register(shutil.rmtree, _TMP, ignore_errors=True)
+
+os.environ.update(
+    DATA_SOURCE="local",
+    SHARED_DATASET="0",
+    HISTORY_DAYS="0",
+    SNAPSHOT_DIR=os.path.join(_TMP, "snapshots"),
+    EXPORT_DIR=os.path.join(_TMP, "exports"),
+    DATASET_STORE_DIR=os.path.join(_TMP, "dataset_store"),
+)
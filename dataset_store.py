@@ -0,0 +1,131 @@
+"""规范化数据集的共享存储，供多个 worker 进程以内存映射方式只读共享。
+
+每个版本是 DATASET_STORE_DIR 下的一个目录：
+
+    <name>/table.arrow    拼接后的全部行（未压缩的 Arrow IPC 文件）
+    <name>/titles.arrow   标题索引里去重后的标题
+    <name>/<数组名>.npy   热度排序、时间、标题索引等 numpy 数组
+    <name>/meta.json      版本号、各平台行范围等
+
+版本目录先写在临时目录里、完整写完再改名；CURRENT 文件记录当前版本目录名，
+同样写临时文件后原子替换。读者 mmap 文件，各进程共享同一份页缓存。
+
+构建与发布只由一个进程（leader）负责，用 flock 选出；其他进程只读取。
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有 flock，每个进程各自构建
+    fcntl = None
+
+STORE_DIR = os.environ.get(
+    "DATASET_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset_store"),
+)
+KEEP_VERSIONS = 2  # 保留当前和上一个版本，正在读旧版本的进程不受影响
+
+
+def _write_table(path, table):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path):
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def current_name():
+    try:
+        with open(os.path.join(STORE_DIR, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(name, tables, arrays, meta):
+    """写入一个版本并把 CURRENT 指向它。"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    final = os.path.join(STORE_DIR, name)
+    if not os.path.isdir(final):
+        tmp = os.path.join(STORE_DIR, f".{name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for key, table in tables.items():
+            _write_table(os.path.join(tmp, f"{key}.arrow"), table)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp, final)
+
+    pointer = os.path.join(STORE_DIR, "CURRENT")
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    _cleanup(name)
+
+
+def open_version(name):
+    """返回 (meta, {表名: pa.Table}, {数组名: 只读内存映射数组})。"""
+    directory = os.path.join(STORE_DIR, name)
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    tables, arrays = {}, {}
+    for file_name in os.listdir(directory):
+        key, ext = os.path.splitext(file_name)
+        path = os.path.join(directory, file_name)
+        if ext == ".arrow":
+            tables[key] = _read_table(path)
+        elif ext == ".npy":
+            arrays[key] = np.load(path, mmap_mode="r")
+    return meta, tables, arrays
+
+
+def _cleanup(current):
+    # 已被其他进程映射的文件删除后仍然可读（Linux 上 inode 在解除映射前保留）
+    versions = []
+    for name in os.listdir(STORE_DIR):
+        path = os.path.join(STORE_DIR, name)
+        if name.startswith(".") or not os.path.isdir(path) or name == current:
+            continue
+        versions.append((os.path.getmtime(path), path))
+    for _, path in sorted(versions, reverse=True)[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class LeaderLock:
+    """非阻塞的 flock：拿到锁的进程负责构建和发布，进程退出时锁自动释放。"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(STORE_DIR, "leader.lock")
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self):
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {time.time()}\n".encode())
+        self._fd = fd
+        return True
@@ -0,0 +1,500 @@
+"""导出文件的流式生成。
+
+所有格式都按块物化数据、写进一个只追加、不可 seek 的缓冲区，每写完一块
+就把已生成的字节交给调用方，内存里同时只有一块数据。zip（CSV 与 xlsx）
+此时改用数据描述符记录大小和 CRC；Parquet 按块写成行组，Arrow IPC 按块
+写成记录批次。各格式都直接从 DataFrame 生成，不经过 CSV 中转。
+"""
+import codecs
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 20000))
+EXPORT_DIR = os.environ.get(
+    "EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports"),
+)
+EXPORT_CACHE_MAX_BYTES = int(float(os.environ.get("EXPORT_CACHE_MAX_MB", 512)) * 2**20)
+
+
+class _Sink:
+    """输出端：只追加，写入的字节由 drain 取走；tell 给 pyarrow 和 zipfile 用。"""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_frames(frame, rows=None, columns=None, progress=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """按块产出 frame 的切片；rows 为要导出的行号（None 表示全部），columns 为投影列。
+
+    只在取到某一块时才按行号物化这一块，空结果也产出一次（用于写表头）。
+    progress(已完成行数, 总行数) 在每块处理完后调用。
+    """
+    if columns is not None:
+        frame = frame[columns]
+    total = len(frame) if rows is None else len(rows)
+    for start in range(0, max(total, 1), chunk_rows):
+        end = start + chunk_rows
+        yield frame.iloc[start:end] if rows is None else frame.iloc[rows[start:end]]
+        if progress is not None:
+            progress(min(end, total), total)
+
+
+def _stream(sink, chunks, write):
+    for chunk in chunks:
+        write(chunk)
+        data = sink.drain()
+        if data:
+            yield data
+
+
+# ===== CSV（zip）=====
+def stream_csv_zip(frame, rows=None, columns=None, progress=None, name="hotsearch.csv"):
+    """产出包含单个 CSV（UTF-8 BOM）的 zip 文件字节流。"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(name, "w", force_zip64=True) as f:
+            f.write(codecs.BOM_UTF8)
+            header = [True]
+
+            def write(chunk):
+                f.write(chunk.to_csv(index=False, header=header[0]).encode("utf-8"))
+                header[0] = False
+
+            yield from _stream(sink, iter_frames(frame, rows, columns, progress), write)
+    yield sink.drain()
+
+
+# ===== JSON Lines =====
+def stream_jsonl(frame, rows=None, columns=None, progress=None):
+    for chunk in iter_frames(frame, rows, columns, progress):
+        if len(chunk):
+            text = chunk.to_json(orient="records", lines=True, force_ascii=False,
+                                 date_format="iso", date_unit="s")
+            yield (text if text.endswith("\n") else text + "\n").encode("utf-8")
+
+
+# ===== Parquet / Arrow IPC =====
+def arrow_schema(frame):
+    """由 dtype 推出固定的 Arrow schema，避免按块推断时空块或全空列得到不同类型。"""
+    fields = []
+    for col, dtype in frame.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            typ = pa.dictionary(pa.int32(), pa.string())
+        elif dtype == object or isinstance(dtype, pd.StringDtype):
+            typ = pa.string()
+        else:
+            typ = pa.from_numpy_dtype(dtype)
+        fields.append(pa.field(str(col), typ))
+    return pa.schema(fields)
+
+
+def _arrow_batches(frame, rows, columns, schema, progress):
+    for chunk in iter_frames(frame, rows, columns, progress):
+        if len(chunk):
+            yield pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def stream_parquet(frame, rows=None, columns=None, progress=None):
+    schema = arrow_schema(frame[columns] if columns is not None else frame)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    yield from _stream(sink, _arrow_batches(frame, rows, columns, schema, progress), writer.write_table)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_arrow(frame, rows=None, columns=None, progress=None):
+    schema = arrow_schema(frame[columns] if columns is not None else frame)
+    sink = _Sink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield from _stream(sink, _arrow_batches(frame, rows, columns, schema, progress), writer.write_table)
+    writer.close()
+    yield sink.drain()
+
+
+# ===== xlsx（只写、流式）=====
+# 直接写 SpreadsheetML：字符串用内联字符串，不需要共享字符串表；
+# 时间写成 Excel 序列值并套用日期格式（styles.xml 里的第 1 号样式）
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="hotsearch" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+}
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+
+
+def _inline(value):
+    return f'<c t="inlineStr"><is><t>{escape(_XML_ILLEGAL.sub("", value))}</t></is></c>'
+
+
+def _xlsx_cells(series):
+    """把一列转成单元格 XML 片段的列表，空值为空串。"""
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        serial = (series.to_numpy() - _EXCEL_EPOCH) / np.timedelta64(1, "D")
+        return ["" if np.isnan(v) else f'<c s="1"><v>{v!r}</v></c>' for v in serial.tolist()]
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return ["" if v != v else f"<c><v>{v!r}</v></c>" for v in series.tolist()]
+    # 空值统一成 None（Arrow 字符串列里是 pd.NA，不能直接比较）
+    values = series.astype(object).where(series.notna(), None)
+    return ["" if v is None else _inline(str(v)) for v in values.tolist()]
+
+
+def stream_xlsx(frame, rows=None, columns=None, progress=None):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_STATIC.items():
+            zf.writestr(name, xml)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b"<sheetData>")
+            header = [True]
+
+            def write(chunk):
+                lines = []
+                if header[0]:
+                    lines.append("<row>" + "".join(_inline(str(c)) for c in chunk.columns) + "</row>")
+                    header[0] = False
+                cells = [_xlsx_cells(chunk[c]) for c in chunk.columns]
+                lines.extend("<row>" + "".join(row) + "</row>" for row in zip(*cells))
+                f.write("".join(lines).encode("utf-8"))
+
+            yield from _stream(sink, iter_frames(frame, rows, columns, progress), write)
+            f.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+# 格式名 -> (文件扩展名, MIME 类型, 生成函数)
+EXPORT_FORMATS = {
+    "csv": ("zip", "application/zip", stream_csv_zip),
+    "parquet": ("parquet", "application/vnd.apache.parquet", stream_parquet),
+    "jsonl": ("jsonl", "application/x-ndjson", stream_jsonl),
+    "arrow": ("arrows", "application/vnd.apache.arrow.stream", stream_arrow),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", stream_xlsx),
+}
+
+
+def resolve_columns(frame, columns):
+    """校验投影列（保持请求顺序），None 或空表示全部列。"""
+    if not columns:
+        return None
+    if isinstance(columns, str):
+        columns = [columns]
+    unknown = [c for c in columns if c not in frame.columns]
+    if unknown:
+        raise ValueError(f"不支持的列：{', '.join(map(str, unknown))}")
+    return list(dict.fromkeys(columns))
+
+
+def stream_export(fmt, frame, rows=None, columns=None, progress=None):
+    """返回 (文件扩展名, MIME 类型, 字节流生成器)；格式和列在调用时即校验。"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}（可选 {', '.join(EXPORT_FORMATS)}）")
+    ext, mimetype, stream = EXPORT_FORMATS[fmt]
+    return ext, mimetype, stream(frame, rows, resolve_columns(frame, columns), progress)
+
+
+# ===== 导出文件缓存 =====
+class ExportCache:
+    """按内容寻址的导出文件缓存。
+
+    文件名为 <数据集指纹>-<请求哈希>.<扩展名>，同一份数据、同样的筛选条件和
+    格式只生成一次，之后直接从磁盘发送。生成时边发送边写临时文件，完整写完
+    才改名为正式文件。总大小超过上限时按最近访问时间（mtime，命中时刷新）
+    淘汰；数据集换版本后旧指纹的文件整体删除。
+
+    导出任务用 pin/unpin 引用自己的结果文件：引用期间不淘汰、不作为旧指纹清理；
+    最后一个引用释放时，缓存关闭或文件已不属于当前指纹就直接删除。引用记在
+    目录里的 .pins/<文件名>/<持有者> 标记文件上，同一目录下的多个 worker 进程
+    都能看到。
+    """
+
+    def __init__(self, directory=EXPORT_DIR, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._prefix = None  # 当前数据集指纹
+        self.stats = {"hit": 0, "miss": 0, "evicted": 0, "stale_removed": 0}
+
+    @staticmethod
+    def file_name(prefix, key, ext):
+        digest = hashlib.sha256(
+            json.dumps(key, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        return f"{prefix}-{digest[:32]}.{ext}"
+
+    def get(self, name):
+        """命中时返回文件路径并刷新访问时间，否则返回 None。"""
+        if self.max_bytes <= 0:
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("miss")
+            return None
+        self._count("hit")
+        return path
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def store(self, name, chunks, always=False):
+        """透传 chunks 的同时写入缓存；只有完整产出后才生效。
+
+        缓存关闭（max_bytes <= 0）时只透传，除非 always（导出任务的结果文件必须落盘）。
+        """
+        if self.max_bytes <= 0 and not always:
+            yield from chunks
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp, os.path.join(self.directory, name))
+        finally:
+            # 客户端中途断开（GeneratorExit）或生成失败时丢弃半成品
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if name.startswith("."):
+                continue  # .gitkeep 与正在写的临时文件
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _pin_dir(self, name):
+        return os.path.join(self.directory, ".pins", name)
+
+    def pin(self, name, owner):
+        for _ in range(3):
+            # 另一个进程可能恰好在 unpin 里删除空目录，重试即可
+            try:
+                os.makedirs(self._pin_dir(name), exist_ok=True)
+                open(os.path.join(self._pin_dir(name), owner), "w").close()
+                return
+            except FileNotFoundError:
+                continue
+        raise OSError(f"无法标记导出文件：{name}")
+
+    def unpin(self, name, owner):
+        try:
+            os.remove(os.path.join(self._pin_dir(name), owner))
+            os.rmdir(self._pin_dir(name))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return  # 还有其他持有者
+        with self._lock:
+            if self.max_bytes <= 0 or (self._prefix and not name.startswith(self._prefix + "-")):
+                self._remove(name)
+                return
+        self.evict()
+
+    def _pinned(self):
+        try:
+            return set(os.listdir(os.path.join(self.directory, ".pins")))
+        except FileNotFoundError:
+            return set()
+
+    def evict(self):
+        """总大小超过上限时从最久未访问的文件开始删除（被引用的文件除外）。"""
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            entries = sorted(self._entries())
+            pinned = self._pinned()
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                if name in pinned:
+                    continue
+                self._remove(name)
+                total -= size
+                self.stats["evicted"] += 1
+
+    def purge_stale(self, prefix):
+        """删除不属于当前数据集指纹的文件。"""
+        with self._lock:
+            self._prefix = prefix
+            pinned = self._pinned()
+            for _, _, name in self._entries():
+                if not name.startswith(prefix + "-") and name not in pinned:
+                    self._remove(name)
+                    self.stats["stale_removed"] += 1
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def snapshot_stats(self):
+        entries = self._entries()
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(files=len(entries), bytes=sum(size for _, size, _ in entries),
+                     max_bytes=self.max_bytes)
+        return stats
+
+
+# ===== 导出任务记录 =====
+class JobStore:
+    """导出任务记录，存为 <目录>/.jobs/<任务 id>.json，同一目录下的 worker 进程共享。
+
+    同一个导出文件同时只允许一个进行中的任务：用 O_EXCL 创建
+    .jobs/active-<文件名> 标记来认领，任务结束时删除。
+    """
+
+    _ID = re.compile(r"[0-9a-f]{32}")
+
+    def __init__(self, directory=EXPORT_DIR):
+        self.directory = os.path.join(directory, ".jobs")
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _marker(self, name):
+        return os.path.join(self.directory, f"active-{name}")
+
+    def save(self, job):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._path(job['id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp, self._path(job["id"]))
+
+    def load(self, job_id):
+        if not self._ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def all(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        jobs = (self.load(n[:-len(".json")]) for n in names if n.endswith(".json"))
+        return [job for job in jobs if job is not None]
+
+    def delete(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def claim(self, name, job_id):
+        """认领成功返回 None，否则返回当前持有者的任务 id。"""
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            fd = os.open(self._marker(name), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            try:
+                with open(self._marker(name), encoding="utf-8") as f:
+                    return f.read().strip()
+            except FileNotFoundError:
+                return ""  # 持有者刚好释放，调用方重试
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(job_id)
+        return None
+
+    def release(self, name, job_id):
+        """只删除仍由 job_id 持有的标记。"""
+        try:
+            with open(self._marker(name), encoding="utf-8") as f:
+                if f.read().strip() != job_id:
+                    return
+            os.remove(self._marker(name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,129 @@
+"""通过 Git Data API 批量发布文件到 GitHub 仓库。
+
+contents API 一次只能提交一个文件，且要把整个文件 base64 后放进内存。
+这里改为：先按 git 的规则流式计算每个文件的 blob SHA，与目标分支现有
+树里的 SHA 相同的文件直接跳过；其余文件逐个创建 blob（请求体边读文件
+边 base64，不整体载入内存），最后一次性创建 tree、commit 并移动分支。
+
+api_base 可以指向本地模拟 GitHub 接口的 HTTP 服务，便于测试。
+"""
+import base64
+import hashlib
+import os
+
+import requests
+
+READ_CHUNK = 3 * 2**18  # 3 的倍数，分块 base64 后可直接拼接
+
+
+def git_blob_sha(path):
+    """与 `git hash-object` 相同的 blob SHA-1，分块读取。"""
+    h = hashlib.sha1(b"blob %d\0" % os.path.getsize(path))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _Base64Body:
+    """创建 blob 的 JSON 请求体：{"encoding": "base64", "content": "..."}。
+
+    提供 read 与 __len__，requests 据此带上 Content-Length 并分块发送，
+    文件内容边读边编码。
+    """
+
+    _HEAD = b'{"encoding":"base64","content":"'
+    _TAIL = b'"}'
+
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path)
+        self._len = len(self._HEAD) + 4 * ((size + 2) // 3) + len(self._TAIL)
+        self._parts = self._iter_parts()
+        self._buffer = b""
+        self._pos = 0
+
+    def __len__(self):
+        return self._len
+
+    def _iter_parts(self):
+        yield self._HEAD
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                yield base64.b64encode(chunk)
+        yield self._TAIL
+
+    def read(self, size=-1):
+        # http.client 以 8 KiB 为单位读取：从当前编码块里按偏移切片，用完再编码下一块
+        if size < 0:
+            data = self._buffer[self._pos:] + b"".join(self._parts)
+            self._buffer, self._pos = b"", 0
+            return data
+        while self._pos >= len(self._buffer):
+            self._buffer, self._pos = next(self._parts, None), 0
+            if self._buffer is None:
+                self._buffer = b""
+                return b""
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+
+class GitHubPublisher:
+    def __init__(self, repo, token=None, branch="main",
+                 api_base="https://api.github.com", session=None):
+        self.repo = repo
+        self.branch = branch
+        self.api_base = api_base.rstrip("/")
+        self.session = session or requests.Session()
+        self.headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            self.headers["Authorization"] = f"token {token}"
+
+    def _request(self, method, path, **kwargs):
+        url = f"{self.api_base}/repos/{self.repo}/{path}"
+        headers = dict(self.headers, **kwargs.pop("headers", {}))
+        r = self.session.request(method, url, headers=headers, timeout=60, **kwargs)
+        if r.status_code >= 400:
+            raise Exception(f"GitHub 接口 {method} {path} 失败（{r.status_code}）：{r.text[:500]}")
+        return r.json()
+
+    def remote_shas(self, tree_sha):
+        """目标树里 路径 -> blob SHA。树过大被截断时只返回拿到的部分（其余按已变化处理）。"""
+        tree = self._request("GET", f"git/trees/{tree_sha}", params={"recursive": "1"})
+        return {item["path"]: item["sha"] for item in tree.get("tree", []) if item.get("type") == "blob"}
+
+    def publish(self, files, message):
+        """files 为 {仓库内路径: 本地文件路径}。
+
+        返回 {"commit": 新提交 SHA（没有变化时为 None）, "uploaded": [...], "skipped": [...]}。
+        """
+        ref = self._request("GET", f"git/ref/heads/{self.branch}")
+        head = ref["object"]["sha"]
+        base_tree = self._request("GET", f"git/commits/{head}")["tree"]["sha"]
+        remote = self.remote_shas(base_tree)
+
+        entries, uploaded, skipped = [], [], []
+        for repo_path, local_path in sorted(files.items()):
+            sha = git_blob_sha(local_path)
+            if remote.get(repo_path) == sha:
+                skipped.append(repo_path)
+                continue
+            created = self._request("POST", "git/blobs", data=_Base64Body(local_path),
+                                    headers={"Content-Type": "application/json"})
+            if created["sha"] != sha:
+                raise Exception(f"blob SHA 不一致：{repo_path}")
+            entries.append({"path": repo_path, "mode": "100644", "type": "blob", "sha": sha})
+            uploaded.append(repo_path)
+
+        if not entries:
+            return {"commit": None, "uploaded": [], "skipped": skipped}
+
+        tree = self._request("POST", "git/trees", json={"base_tree": base_tree, "tree": entries})
+        commit = self._request("POST", "git/commits", json={
+            "message": message, "tree": tree["sha"], "parents": [head]})
+        self._request("PATCH", f"git/refs/heads/{self.branch}", json={"sha": commit["sha"]})
+        return {"commit": commit["sha"], "uploaded": uploaded, "skipped": skipped}
+
+    def raw_url(self, repo_path):
+        return f"https://raw.githubusercontent.com/{self.repo}/{self.branch}/{repo_path}"
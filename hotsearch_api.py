@@ -1,16 +1,35 @@
 from flask import Flask, request, jsonify
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import re
 import os
 from io import BytesIO
+import sys
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import base64
+import json
 import time
-from flask import Response
+import itertools
+import threading
+import multiprocessing
+import uuid
+import mmap
+import socket
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from flask import Response, send_file
 import zipfile
 from io import BytesIO
+from collections import OrderedDict
+
+import dataset_store
+import exporters
+import snapshot
+import xlsx_stream
+from github_publish import GitHubPublisher
+from title_index import TitleIndex, TopicQuery
 
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
@@ -18,15 +37,29 @@ app.config["JSON_AS_ASCII"] = False
 # ===== GitHub 上传配置 =====
 
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
-GITHUB_REPO = "ruining1030-droid/hotsearch-data"
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_REPO}/contents/exports/"
+GITHUB_REPO = os.environ.get("GITHUB_REPO", "ruining1030-droid/hotsearch-data")
+GITHUB_BRANCH = os.environ.get("GITHUB_BRANCH", "main")
+# 可指向模拟 GitHub 接口的本地服务
+GITHUB_API_BASE = os.environ.get("GITHUB_API_BASE", "https://api.github.com")
 
 # ===== 数据源文件 =====
-platform_files = {
-    "weibo":   "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/weibo_hotsearch.xlsx",
-    "toutiao": "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/toutiao_hotsearch.xlsx",
-    "baidu":   "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/baidu_hotsearch.xlsx",
-}
+# DATA_SOURCE=local 时改从本地目录读取：默认是仓库自带的工作簿，
+# DATA_DIR 也可以指向一个本地镜像目录。本地文件用 mmap 读取。
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_SOURCE = os.environ.get("DATA_SOURCE", "remote")
+DATA_DIR = os.environ.get("DATA_DIR", BASE_DIR)
+
+if DATA_SOURCE == "local":
+    platform_files = {
+        p: os.path.join(DATA_DIR, f"{p}_hotsearch.xlsx")
+        for p in ("weibo", "toutiao", "baidu")
+    }
+else:
+    platform_files = {
+        "weibo":   "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/weibo_hotsearch.xlsx",
+        "toutiao": "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/toutiao_hotsearch.xlsx",
+        "baidu":   "https://raw.githubusercontent.com/ruining1030-droid/hotsearch-data/main/baidu_hotsearch.xlsx",
+    }
 
 # ===== Requests 会话（稳定下载）=====
 def make_session():
@@ -40,25 +73,976 @@ def make_session():
 
 SESSION = make_session()
 
-def fetch_excel(url):
-    r = SESSION.get(url, timeout=30)
+# ===== 数据源读取 =====
+# 数据源可以是 URL 或本地路径。fetch_source 返回 (blob, validators)：
+# blob 为 None 表示相对上次的 validators 未变化；远程的 blob 是下载到的
+# bytes，本地的 blob 就是文件路径，由使用方（包括解析进程）自行 mmap。
+def fetch_source(location, validators=None):
+    if location.startswith(("http://", "https://")):
+        return _fetch_http(location, validators)
+    return _fetch_local(location, validators)
+
+
+def _fetch_http(url, validators):
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    r = SESSION.get(url, timeout=30, headers=headers)
+    if validators and r.status_code == 304:
+        return None, validators
     r.raise_for_status()
-    return pd.read_excel(BytesIO(r.content))
+    return r.content, {"etag": r.headers.get("ETag"),
+                       "last_modified": r.headers.get("Last-Modified")}
+
+
+def _fetch_local(path, validators):
+    st = os.stat(path)
+    current = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if validators == current:
+        return None, validators
+    return path, current
+
+
+class MappedFile(mmap.mmap):
+    # zipfile 要求文件对象实现 seekable()，Python 3.13 之前的 mmap 没有
+    def seekable(self):
+        return True
+
+
+def open_blob(blob):
+    if isinstance(blob, str):
+        with open(blob, "rb") as f:
+            return MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return BytesIO(blob)
+
+
+def blob_digest(blob):
+    if isinstance(blob, str):
+        with open_blob(blob) as mm:
+            return snapshot.content_hash(mm)
+    return snapshot.content_hash(blob)
+
+# ===== 并行下载 / 解析 =====
+# 下载在线程池中并发进行；openpyxl 解析是 CPU 密集型，放到进程池里绕开 GIL。
+# 进程池用 spawn 启动，避免在多线程的 waitress 进程里 fork。
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 3))
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+# 各工作表表头略有出入，统一成同一套列名
+COLUMN_ALIASES = {"热度原始数据": "热度原始数值"}
+
+# API 实际用到的列；描叙、缩略图几乎全空，不读
+USECOLS = ["标题", "链接", "时间", "热度原始数值", "热度"]
+
+
+def workbook_sheet_names(blob):
+    with zipfile.ZipFile(open_blob(blob)) as zf:
+        return [name for name, _ in xlsx_stream.sheet_paths(zf)]
+
+
+def combine_sheets(sheets):
+    sheets = [df.rename(columns=COLUMN_ALIASES) for df in sheets if not df.empty]
+    return pd.concat(sheets, ignore_index=True)
+
+
+def read_workbook(blob, sheets=None):
+    frames = xlsx_stream.read_xlsx(open_blob(blob), columns=USECOLS,
+                                   sheets=sheets, aliases=COLUMN_ALIASES)
+    return combine_sheets(frames.values())
+
+
+def parse_workbook(blob):
+    # 每个工作表交给一个进程流式解析，最后按统一表头拼接；
+    # 只有一个解析进程时逐表提交没有收益（每次都要重读共享字符串），整本交给它
+    pool = get_parse_pool()
+    if PARSE_WORKERS <= 1:
+        return pool.submit(read_workbook, blob).result()
+    futures = [pool.submit(read_workbook, blob, [name])
+               for name in workbook_sheet_names(blob)]
+    return combine_sheets([f.result() for f in futures])
+
+
+# 仓库里的 CSV 源：名称 -> (文件名, 编码)
+CSV_SOURCES = {
+    "summary":   ("全网热搜总表.csv", "utf-8-sig"),
+    "baidu_csv": ("baidu.csv", "gbk"),
+}
+CSV_ALIASES = {"其他": "热度"}
+
+
+def parse_csv(blob, encoding):
+    # read_csv 需要识别为二进制流才会按 encoding 解码，路径直接交给 pandas 读取
+    source = blob if isinstance(blob, str) else BytesIO(blob)
+    df = pd.read_csv(source, encoding=encoding).rename(columns=CSV_ALIASES)
+    for col in ("时间", "日期"):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+def get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+# ===== 数据集缓存（按平台，ETag / Last-Modified 条件请求复验）=====
+# 在 CACHE_REVALIDATE_SECONDS 内直接命中内存；超时后带条件头复验，
+# 304 或内容哈希未变时沿用已解析的 DataFrame，不再重复下载和解析。
+CACHE_REVALIDATE_SECONDS = float(os.environ.get("CACHE_REVALIDATE_SECONDS", 60))
+
+CACHE_STATS = {"hit": 0, "miss": 0, "revalidate": 0}
+_dataset_cache = {}
+_cache_lock = threading.Lock()
+_version_counter = itertools.count(1)
+
+
+def _count(key, n=1):
+    with _cache_lock:
+        CACHE_STATS[key] += n
+
+
+class SingleFlight:
+    """同一个键同时只执行一次，其余并发调用方等待并共享它的结果（或异常）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"leader": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            self.stats["leader" if leader else "coalesced"] += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+_load_flight = SingleFlight()
+
+
+def load_platform(platform):
+    entry = _dataset_cache.get(platform)
+    if entry and time.time() - entry["checked_at"] < CACHE_REVALIDATE_SECONDS:
+        _count("hit")
+        return entry
+
+    # 冷启动时的一波并发请求：同一平台、同一缓存版本只下载解析一次
+    key = (platform, entry["version"] if entry else None)
+    return _load_flight.do(key, lambda: _load_platform(platform))
+
+
+def _load_platform(platform):
+    location = platform_files[platform]
+    entry = _dataset_cache.get(platform)
+    now = time.time()
+
+    if entry and now - entry["checked_at"] < CACHE_REVALIDATE_SECONDS:
+        # 等待期间别的调用刚刚加载过
+        _count("hit")
+        return entry
+
+    blob, validators = fetch_source(location, entry["validators"] if entry else None)
+    if entry and blob is None:
+        entry["checked_at"] = now
+        _count("revalidate")
+        return entry
+
+    digest = blob_digest(blob)
+    if entry and entry["sha256"] == digest:
+        # 数据源不支持条件请求（或只是 mtime 变了），内容未变：只更新校验信息，不重新解析
+        entry.update(validators=validators, checked_at=now)
+        _count("revalidate")
+        return entry
+
+    # 缓存条目只记内容哈希和校验信息，原始数据留在快照里，需要重新规范化时再读
+    # （read_platform）；只有快照写不进去时才把解析结果留在内存
+    entry = {
+        "df": ensure_snapshot(platform, blob, digest, location),
+        "validators": validators,
+        "sha256": digest,
+        "version": next(_version_counter),
+        "checked_at": now,
+    }
+    _dataset_cache[platform] = entry
+    _count("miss")
+    return entry
+
+
+# 只把最近 HISTORY_DAYS 天（以快照里最新的时间为终点）的月分区载入内存，
+# 0 表示全部载入；历史再长，启动和刷新也只读与窗口重叠的分区
+HISTORY_DAYS = float(os.environ.get("HISTORY_DAYS", 0))
+
+
+def history_start(platform):
+    if HISTORY_DAYS <= 0:
+        return None
+    latest = snapshot.latest_time(platform)
+    return latest - pd.Timedelta(days=HISTORY_DAYS) if latest is not None else None
+
+
+def _in_window(df):
+    """没有快照可读时直接用解析结果，同样只保留 HISTORY_DAYS 窗口内的行。"""
+    if HISTORY_DAYS <= 0 or "时间" not in df.columns:
+        return df
+    times = pd.to_datetime(df["时间"], errors="coerce")
+    if times.isna().all():
+        return df.iloc[:0]
+    return df[(times >= times.max() - pd.Timedelta(days=HISTORY_DAYS)).to_numpy()]
+
+
+def ensure_snapshot(platform, blob, digest, source=None):
+    """保证这份内容有列式快照；快照写入失败时返回（窗口内的）解析结果，否则返回 None。"""
+    # 同一份工作簿之前解析过（例如进程重启后）就不必再解析
+    if snapshot.is_current(platform, digest):
+        return None
+    df = parse_workbook(blob)
+    try:
+        written = snapshot.write_snapshot(platform, df, digest, source=source)
+        app.logger.info("快照已更新 %s：%s", platform, ", ".join(written) or "无变化分区")
+        return None
+    except Exception as e:
+        app.logger.warning("快照写入失败 %s：%s", platform, e)
+        return _in_window(df)
+
+
+def read_platform(platform, entry):
+    """load_platform 缓存条目对应的原始数据（HISTORY_DAYS 窗口内，USECOLS 列）。"""
+    if entry["df"] is not None:
+        return entry["df"]
+    return snapshot.read_snapshot(platform, columns=USECOLS, start=history_start(platform))
+
+
+def cache_stats():
+    with _cache_lock:
+        stats = dict(CACHE_STATS)
+    with _load_flight._lock:
+        stats["single_flight"] = dict(_load_flight.stats)
+    stats["versions"] = {p: e["version"] for p, e in _dataset_cache.items()}
+    dataset = _current_dataset
+    stats["dataset_version"] = dataset.version if dataset else None
+    stats["shared"] = {"enabled": SHARED_DATASET, "leader": _leader_lock.held,
+                       "store": dataset.store_name if dataset else None}
+    stats["results"] = RESULT_CACHE.snapshot_stats()
+    stats["exports"] = EXPORT_CACHE.snapshot_stats()
+    jobs = EXPORT_JOBS.all()
+    stats["export_jobs"] = {status: sum(j["status"] == status for j in jobs)
+                            for status in ("queued", "running", "done", "failed")}
+    return stats
 
 # ===== 读取全部或指定平台 =====
-def load_data(platform):
-    dfs = []
-    if platform in platform_files:
-        df = fetch_excel(platform_files[platform])
-        df["平台"] = platform
-        dfs.append(df)
-    else:
-        for p, url in platform_files.items():
-            tmp = fetch_excel(url)
-            tmp["平台"] = p
-            dfs.append(tmp)
+def load_platforms(platforms):
+    """并发加载多个平台，返回 (entries, errors)，单个平台失败不影响其他平台。"""
+    futures = {p: _fetch_pool.submit(load_platform, p) for p in platforms}
+    entries, errors = {}, {}
+    for p, fut in futures.items():
+        try:
+            entries[p] = fut.result()
+        except Exception as e:
+            errors[p] = str(e)
+    return entries, errors
+
+
+# ===== 数据集版本与后台刷新 =====
+# 请求只读取 _current_dataset 指向的完整版本；后台线程按 REFRESH_INTERVAL
+# 复验数据源，在旁边构建好下一个版本后一次性替换引用（双缓冲），
+# 读者既不会等待重新加载，也不会看到构建了一半的数据。
+REFRESH_INTERVAL = float(os.environ.get("REFRESH_INTERVAL", 300))
+
+
+class Dataset:
+    def __init__(self, version, frames, sources, errors, index=None, digests=None):
+        self.version = version    # 数据集版本号，任一平台内容变化即递增
+        self.frames = frames      # 平台 -> 已规范化的 DataFrame（只读共享）
+        self.sources = sources    # 平台 -> load_platform 缓存条目的版本
+        self.errors = errors      # 最近一次刷新失败的平台 -> 错误信息
+        self.digests = digests or {}  # 平台 -> 源文件 sha256
+        self.created_at = time.time()
+        self.history_days = HISTORY_DAYS
+        self.normalize_version = NORMALIZE_VERSION
+        self.store_name = None    # 从共享存储映射而来时为版本目录名
+
+        # 数据内容的指纹：版本号只在进程内有效，跨进程、重启后仍需一致的
+        # 场景（磁盘上的导出缓存）用源文件哈希、载入窗口和规范化规则版本算出的指纹
+        self.fingerprint = snapshot.content_hash(json.dumps(
+            [sorted(self.digests.items()), HISTORY_DAYS, NORMALIZE_VERSION]).encode())[:16]
+
+        # 全平台拼接结果与标题索引，每个版本只构建一次；
+        # 各平台在拼接结果里占连续的一段行号 ranges[p] = (start, end)
+        self.combined = pd.concat(frames.values(), ignore_index=True) if frames else None
+        self.ranges = {}
+        start = 0
+        for p, df in frames.items():
+            self.ranges[p] = (start, start + len(df))
+            start += len(df)
+        if index is None and self.combined is not None:
+            index = TitleIndex(self.combined["标题"])
+        self.index = index
+
+        # 各平台内部按时间升序存放（无法解析的时间排在末尾），
+        # time_ends[p] 是该平台最后一条有时间的行之后的位置
+        self.times = self.combined["时间"].to_numpy() if self.combined is not None else None
+        self.time_ends = {}
+        for p, (start, end) in self.ranges.items():
+            self.time_ends[p] = start + int(frames[p]["时间"].notna().sum())
+        valid = [self.times[end - 1] for p, end in self.time_ends.items() if end > self.ranges[p][0]]
+        self.latest = max(valid) if valid else None
+
+        # 按热度降序（并列时按行号）的行号排列：全平台一份，各平台各一份
+        # heat_keys 是对应位置热度的相反数（升序），用于按游标二分定位
+        self.heat_order = {}
+        self.heat_keys = {}
+        self.heat = self.combined["热度"].to_numpy() if self.combined is not None else None
+        if self.combined is not None:
+            heat = self.heat
+            order = np.argsort(-heat, kind="stable")
+            self.heat_order["all"] = order
+            for p, (start, end) in self.ranges.items():
+                self.heat_order[p] = order[(order >= start) & (order < end)]
+            for key, rows in self.heat_order.items():
+                self.heat_keys[key] = -heat[rows]
+
+    # ----- 共享存储：表写成 Arrow，排序和索引数组写成 .npy，读取时全部内存映射 -----
+    def to_store(self):
+        """返回 dataset_store.publish 需要的 (tables, arrays, meta)。"""
+        titles = self.index.titles
+        tables = {
+            "table": pa.Table.from_pandas(self.combined, schema=exporters.arrow_schema(self.combined),
+                                          preserve_index=False),
+            "titles": pa.table({"title": titles if isinstance(titles, pa.Array)
+                                else pa.array(titles, pa.string())}),
+        }
+        arrays = {"heat": self.heat, "times": self.times}
+        arrays.update({f"heat_order.{k}": v for k, v in self.heat_order.items()})
+        arrays.update({f"heat_keys.{k}": v for k, v in self.heat_keys.items()})
+        arrays.update({f"index.{k}": v for k, v in self.index.to_arrays().items()})
+        meta = {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "sources": self.sources,
+            "digests": self.digests,
+            "errors": self.errors,
+            "ranges": self.ranges,
+            "time_ends": self.time_ends,
+            "latest": None if self.latest is None else str(self.latest),
+            "index_size": self.index.size,
+            "history_days": self.history_days,
+            "normalize_version": self.normalize_version,
+            "created_at": self.created_at,
+        }
+        return tables, arrays, meta
+
+    @classmethod
+    def from_store(cls, name):
+        """映射共享存储里的一个版本；字符串列保持 Arrow 存储，不复制成 Python 对象。"""
+        meta, tables, arrays = dataset_store.open_version(name)
+        ds = cls.__new__(cls)
+        ds.store_name = name
+        for key in ("version", "fingerprint", "sources", "digests", "errors",
+                    "history_days", "created_at"):
+            setattr(ds, key, meta[key])
+        ds.normalize_version = meta.get("normalize_version", 1)
+        ds.combined = tables["table"].to_pandas(
+            split_blocks=True, types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+        ds.ranges = {p: tuple(r) for p, r in meta["ranges"].items()}
+        ds.frames = {p: ds.combined.iloc[start:end] for p, (start, end) in ds.ranges.items()}
+        ds.index = TitleIndex.from_arrays(
+            {k: arrays[f"index.{k}"] for k in TitleIndex.ARRAYS},
+            tables["titles"].column(0).combine_chunks(), meta["index_size"])
+        ds.heat = arrays["heat"]
+        ds.times = arrays["times"]
+        ds.time_ends = meta["time_ends"]
+        ds.latest = None if meta["latest"] is None else np.datetime64(meta["latest"])
+        ds.heat_order = {k.split(".", 1)[1]: v for k, v in arrays.items() if k.startswith("heat_order.")}
+        ds.heat_keys = {k.split(".", 1)[1]: v for k, v in arrays.items() if k.startswith("heat_keys.")}
+        return ds
+
+    def compatible(self):
+        """载入窗口和规范化规则与当前配置一致，可以沿用。"""
+        return self.history_days == HISTORY_DAYS and self.normalize_version == NORMALIZE_VERSION
+
+    def frame(self, platform):
+        return self.frames.get(platform) if platform in platform_files else self.combined
+
+    def search_rows(self, platform, query):
+        """标题满足 query 的行号（拼接结果中的位置，升序）。"""
+        rows = self.index.search(query)
+        if platform in self.ranges:
+            start, end = self.ranges[platform]
+            rows = rows[(rows >= start) & (rows < end)]
+        return rows
+
+    def time_rows(self, platform, start=None, end=None):
+        """时间落在 [start, end) 的行号（升序），每个平台二分两次即可。"""
+        parts = []
+        for p in [platform] if platform in self.ranges else self.ranges:
+            lo, hi = self.ranges[p][0], self.time_ends[p]
+            times = self.times[lo:hi]
+            a = np.searchsorted(times, start, side="left") if start is not None else 0
+            b = np.searchsorted(times, end, side="left") if end is not None else len(times)
+            parts.append(np.arange(lo + a, lo + max(a, b)))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def select_rows(self, platform, query=None, period=None):
+        """同时满足话题和时间范围的行号（升序），都不限定时返回 None。"""
+        rows = self.search_rows(platform, query) if query else None
+        if period:
+            in_range = self.time_rows(platform, *period.bounds(self.latest))
+            rows = in_range if rows is None else np.intersect1d(rows, in_range, assume_unique=True)
+        return rows
+
+    def cursor_position(self, key, after):
+        """after = (热度, 行号)：返回预排序列里排在它之后的第一个位置。"""
+        heat, row = after
+        keys = self.heat_keys[key]
+        lo = np.searchsorted(keys, -heat, side="left")
+        hi = np.searchsorted(keys, -heat, side="right")
+        # 热度相同的行按行号升序排列
+        return lo + np.searchsorted(self.heat_order[key][lo:hi], row, side="right")
+
+    def top_rows(self, platform, limit=0, rows=None, after=None):
+        """按热度降序返回前 limit 个行号（limit <= 0 表示全部）。
+
+        rows 为筛选后的候选行号（升序），None 表示不筛选。不筛选时直接切
+        预排好的序列；候选较多时沿预排序列走、凑够 limit 条即停；候选很少
+        时直接在候选里选前 K 更快。after 为上一页最后一行的 (热度, 行号)，
+        只返回排在它之后的行。
+        """
+        key = "all" if platform not in self.ranges else platform
+        order = self.heat_order[key]
+        if after is not None:
+            order = order[self.cursor_position(key, after):]
+            if rows is not None:
+                heat = self.heat[rows]
+                rows = rows[(heat < after[0]) | ((heat == after[0]) & (rows > after[1]))]
+        if rows is None:
+            return order[:limit] if limit > 0 else order
+        if limit <= 0:
+            mask = np.zeros(len(self.combined), dtype=bool)
+            mask[rows] = True
+            return order[mask[order]]
+        if len(rows) * len(rows) <= len(order) * limit:
+            heat = self.heat[rows]
+            return rows[top_k_positions(heat, limit)]
+
+        mask = np.zeros(len(self.combined), dtype=bool)
+        mask[rows] = True
+        hits = []
+        found = 0
+        step = max(limit * 4, 1024)
+        for i in range(0, len(order), step):
+            chunk = order[i:i + step]
+            chunk = chunk[mask[chunk]]
+            hits.append(chunk)
+            found += len(chunk)
+            if found >= limit:
+                break
+        return np.concatenate(hits)[:limit]
+
+
+_current_dataset = None
+_dataset_lock = threading.Lock()
+_dataset_versions = itertools.count(1)
+_refresher = None
+_loader_lock = threading.Lock()  # 只保护后台线程的创建，不与数据集加载互相等待
+
+
+def build_dataset(previous=None):
+    entries, errors = load_platforms(list(platform_files))
+    sources = {p: e["version"] for p, e in entries.items()}
+    digests = {p: e["sha256"] for p, e in entries.items()}
+
+    # 按源文件内容判断能否沿用上一版本（上一版本可能来自别的进程发布的共享存储）
+    if previous is not None and not previous.compatible():
+        previous = None
+
+    frames = {}
+    for p in platform_files:
+        if p in entries:
+            if previous and previous.digests.get(p) == digests[p]:
+                frames[p] = previous.frames[p]
+            else:
+                frames[p] = normalize_frame(read_platform(p, entries[p]), p)
+        elif previous and p in previous.frames:
+            # 本次刷新失败：沿用上一版本的数据，同时报告错误
+            frames[p] = previous.frames[p]
+            sources[p] = previous.sources[p]
+            digests[p] = previous.digests.get(p)
+
+    if previous and digests == previous.digests:
+        if errors == previous.errors:
+            return previous
+        # 数据没变，只是错误信息变了：沿用索引
+        return Dataset(previous.version, frames, sources, errors,
+                       index=previous.index, digests=digests)
+    return Dataset(next(_dataset_versions), frames, sources, errors, digests=digests)
+
+
+def _swap_dataset(dataset):
+    # 调用方持有 _dataset_lock；换入新数据集时旧版本的查询结果全部作废
+    global _current_dataset
+    if dataset is not _current_dataset:
+        _current_dataset = dataset
+        RESULT_CACHE.clear()
+        with _history_lock:
+            _history_cache.clear()
+        try:
+            EXPORT_CACHE.purge_stale(dataset.fingerprint)
+        except OSError as e:
+            app.logger.warning("清理过期导出文件失败：%s", e)
+    return dataset
+
+
+# ===== 多进程共享数据集 =====
+# SHARED_DATASET=1（默认）时，只有持有 flock 的 leader 进程下载、解析和构建，
+# 构建好的版本发布到 dataset_store；包括 leader 在内的所有 worker 都内存映射
+# 同一份文件，增加 worker 不会成倍增加内存。其他进程每 DATASET_POLL_INTERVAL
+# 秒检查一次 CURRENT 指针，leader 退出后由下一个检查到的进程接替。
+SHARED_DATASET = os.environ.get("SHARED_DATASET", "1") != "0"
+DATASET_POLL_INTERVAL = float(os.environ.get("DATASET_POLL_INTERVAL", 5))
+DATASET_WAIT_SECONDS = float(os.environ.get("DATASET_WAIT_SECONDS", 120))
+_leader_lock = dataset_store.LeaderLock()
+
+
+def is_leader():
+    global _dataset_versions
+    if not SHARED_DATASET or _leader_lock.held:
+        return True
+    try:
+        if not _leader_lock.acquire():
+            return False
+    except OSError as e:
+        app.logger.warning("无法获取 leader 锁，按单进程运行：%s", e)
+        return True
+    # 接替时版本号从已发布的版本之后继续，各进程看到的版本号（以及游标）保持一致
+    name = dataset_store.current_name()
+    if name is not None:
+        try:
+            published = dataset_store.open_version(name)[0]["version"]
+            _dataset_versions = itertools.count(published + 1)
+        except (OSError, ValueError, KeyError) as e:
+            app.logger.warning("读取已发布版本失败：%s", e)
+    return True
+
+
+def publish_dataset(dataset):
+    """把 leader 构建的数据集发布到共享存储，返回映射后的版本（失败时原样返回）。"""
+    name = f"{dataset.version:06d}-{dataset.fingerprint}-{uuid.uuid4().hex[:6]}"
+    try:
+        dataset_store.publish(name, *dataset.to_store())
+        return Dataset.from_store(name)
+    except Exception as e:
+        app.logger.warning("数据集发布失败，仅在本进程使用：%s", e)
+        return dataset
+    finally:
+        # 写 Arrow 表时分配的缓冲区已不再需要，交还给系统
+        pa.default_memory_pool().release_unused()
+
+
+def _follow(current):
+    """follower：映射 leader 发布的最新版本。
+
+    冷启动时最多等 DATASET_WAIT_SECONDS；等待中成为 leader 返回 None，
+    超时仍没有发布则在本进程构建（不发布）。
+    """
+    deadline = time.time() + DATASET_WAIT_SECONDS
+    name = dataset_store.current_name()
+    while name is None and current is None:
+        if is_leader():
+            return None
+        if time.time() >= deadline:
+            return build_dataset(current)
+        time.sleep(0.2)
+        name = dataset_store.current_name()
+    if name is None or (current is not None and current.store_name == name):
+        return current
+    return Dataset.from_store(name)
+
+
+def _next_dataset(current):
+    dataset = None if is_leader() else _follow(current)
+    if dataset is None:
+        dataset = build_dataset(current)
+        if SHARED_DATASET and dataset is not current and dataset.frames:
+            dataset = publish_dataset(dataset)
+    return dataset
+
+
+def refresh_dataset():
+    with _dataset_lock:
+        return _swap_dataset(_next_dataset(_current_dataset))
+
+
+def _refresh_loop():
+    last_build = time.time()
+    while True:
+        # follower 较频繁地检查新版本；leader 仍按 REFRESH_INTERVAL 重新加载
+        time.sleep(min(REFRESH_INTERVAL, DATASET_POLL_INTERVAL) if SHARED_DATASET else REFRESH_INTERVAL)
+        try:
+            if is_leader():
+                if time.time() - last_build < REFRESH_INTERVAL:
+                    continue
+                last_build = time.time()
+            refresh_dataset()
+        except Exception as e:
+            app.logger.warning("后台刷新失败：%s", e)
+
+
+def start_refresher():
+    global _refresher
+    with _loader_lock:
+        if _refresher is None and REFRESH_INTERVAL > 0:
+            _refresher = threading.Thread(target=_refresh_loop, name="refresher", daemon=True)
+            _refresher.start()
+
+
+# ===== 冷启动 =====
+# 进程启动时直接映射上次发布到 dataset_store 的版本，不必等重新下载、解析
+# 全部工作簿就能服务；随后在后台重新校验上游数据源，有变化再构建并发布新版本。
+# 部署平台的本地磁盘不持久时，DATASET_STORE_DIR 需要指向持久化磁盘。
+_background_loader = None
+
+
+def _load_in_background(target):
+    global _background_loader
+    with _loader_lock:
+        if _background_loader is None or not _background_loader.is_alive():
+            _background_loader = threading.Thread(target=target, name="revalidate", daemon=True)
+            _background_loader.start()
+
+
+def _revalidate():
+    try:
+        refresh_dataset()
+    except Exception as e:
+        app.logger.warning("后台校验数据源失败：%s", e)
+
+
+def _warm_dataset():
+    """映射上次持久化的版本；没有可用版本时返回 None。调用方持有 _dataset_lock。"""
+    name = dataset_store.current_name() if SHARED_DATASET else None
+    if name is None:
+        return None
+    try:
+        dataset = Dataset.from_store(name)
+    except Exception as e:
+        app.logger.warning("读取持久化数据集失败：%s", e)
+        return None
+    return dataset if dataset.compatible() and dataset.frames else None
+
+
+def warm_start(blocking=True):
+    """有持久化版本时立即作为当前数据集，并在后台重新校验数据源。返回当前数据集或 None。
+
+    blocking=False 时若另一个线程正在加载则直接返回 None。
+    """
+    if not _dataset_lock.acquire(blocking):
+        return None
+    try:
+        if _current_dataset is not None and _current_dataset.frames:
+            return _current_dataset
+        dataset = _warm_dataset()
+        if dataset is None:
+            return None
+        _swap_dataset(dataset)
+    finally:
+        _dataset_lock.release()
+    _load_in_background(_revalidate)
+    start_refresher()
+    return dataset
 
-    return pd.concat(dfs, ignore_index=True)
+
+def get_dataset():
+    global _current_dataset
+    if REFRESH_INTERVAL <= 0:
+        return refresh_dataset()
+
+    if _current_dataset is None or not _current_dataset.frames:
+        if warm_start() is None:
+            # 没有可用的持久化版本时在请求里同步加载，并发的请求只加载一次
+            with _dataset_lock:
+                if _current_dataset is None or not _current_dataset.frames:
+                    _swap_dataset(_next_dataset(_current_dataset))
+            start_refresher()
+    return _current_dataset
+
+
+def _dataset_for(platform, period=None):
+    dataset = get_dataset()
+    platforms = [platform] if platform in platform_files else list(platform_files)
+    errors = {p: dataset.errors[p] for p in platforms if p in dataset.errors}
+    if dataset.frame(platform) is None:
+        raise Exception(f"数据加载失败：{errors}")
+    return history_dataset(dataset, platform, period), errors
+
+
+# ===== 早于内存窗口的时间范围 =====
+# HISTORY_DAYS > 0 时内存里只有最近的窗口。时间范围延伸到窗口之前的查询改为
+# 从快照读取与范围重叠的月分区，用这些行临时构建一个数据集（版本号沿用当前
+# 数据集，游标照常可用）；最近用过的几个范围缓存在内存里。
+HISTORY_CACHE_SIZE = 4
+_history_cache = OrderedDict()
+_history_lock = threading.Lock()
+
+
+def history_dataset(dataset, platform, period):
+    if HISTORY_DAYS <= 0 or not period:
+        return dataset
+    start, end = period.bounds(dataset.latest)
+    platforms = [platform] if platform in dataset.ranges else list(dataset.ranges)
+    windows = [history_start(p) for p in platforms]
+    if all(w is None or (start is not None and pd.Timestamp(start) >= w) for w in windows):
+        return dataset
+
+    key = (dataset.version, tuple(platforms), start, end)
+    with _history_lock:
+        if key in _history_cache:
+            _history_cache.move_to_end(key)
+            return _history_cache[key]
+
+    frames = {}
+    for p in platforms:
+        if snapshot.snapshot_meta(p) is None:
+            raise ValueError(f"查询范围早于内存中的最近 {HISTORY_DAYS:g} 天，且 {p} 没有可读取的快照")
+        frames[p] = normalize_frame(snapshot.read_snapshot(p, USECOLS, start, end), p)
+    history = Dataset(dataset.version, frames, dataset.sources, dataset.errors, digests=dataset.digests)
+
+    with _history_lock:
+        _history_cache[key] = history
+        while len(_history_cache) > HISTORY_CACHE_SIZE:
+            _history_cache.popitem(last=False)
+    return history
+
+
+def query_page(platform, topic=None, limit=0, cursor=None, period=None):
+    """按热度降序取一页（limit <= 0 为全部），返回 (df, errors, next_cursor)。
+
+    topic 可以是字面关键词，也可以是 {"and"/"or"/"not"/"regex"} 组合查询；
+    period 为 TimeRange。行号沿数据集预排好的热度序列取，不在请求里排序。
+
+    cursor 为上一页返回的 next_cursor；next_cursor 为 None 表示已经没有后续数据。
+    """
+    dataset, rows, errors, next_cursor = query_rows(platform, topic, limit, cursor, period)
+    return dataset.combined.iloc[rows], errors, next_cursor
+
+
+def query_rows(platform, topic=None, limit=0, cursor=None, period=None):
+    """同 query_page，但只返回 (dataset, 行号, errors, next_cursor)，由调用方按需物化。"""
+    dataset, errors = _dataset_for(platform, period)
+    after = decode_cursor(cursor, dataset.version) if cursor else None
+    rows = dataset.select_rows(platform, TopicQuery.parse(topic), period)
+    rows = dataset.top_rows(platform, limit, rows, after)
+
+    next_cursor = None
+    if limit > 0 and len(rows) == limit:
+        last = rows[-1]
+        heat = dataset.heat[last]
+        next_cursor = encode_cursor(dataset.version, int(heat), int(last))
+    return dataset, rows, errors, next_cursor
+
+
+# ===== 时间范围 =====
+# start / end 为绝对时间（只写日期的 end 包含当天），time_period 为相对时间，
+# 如 "24h"、"7d"、"最近3天"、"近一周"，以数据集里最新的时间为终点。
+# 无法识别的 time_period 只用于摘要文字，不做筛选。
+# 整个字符串都是时间跨度才算（可带“最近/近/过去/last/past”前缀），
+# 避免“3月12日”这类日期文字被当成“最近 12 天”；“日”作单位时必须带前缀
+_RELATIVE_PERIOD = re.compile(
+    r"(最近|近|过去|last|past)?\s*(\d+|[一二两三四五六七八九]?十[一二三四五六七八九]?|[一二两三四五六七八九])"
+    r"\s*个?\s*(h|hours?|小时|d|days?|天|日|w|weeks?|周|星期)(?:内|以内)?", re.I)
+_CN_NUMBERS = dict(zip("一二两三四五六七八九", [1, 2, 2, 3, 4, 5, 6, 7, 8, 9]))
+_PERIOD_UNITS = {"h": "h", "hour": "h", "hours": "h", "小时": "h",
+                 "d": "D", "day": "D", "days": "D", "天": "D", "日": "D",
+                 "w": "W", "week": "W", "weeks": "W", "周": "W", "星期": "W"}
+
+
+class TimeRange:
+    def __init__(self, start=None, end=None, span=None):
+        self.start = start
+        self.end = end
+        self.span = span
+
+    @staticmethod
+    def _number(text):
+        """阿拉伯数字或九十九以内的中文数字（十五、二十、二十五）。"""
+        if text.isdigit():
+            return int(text)
+        tens, sep, ones = text.partition("十")
+        if not sep:
+            return _CN_NUMBERS[text]
+        return (_CN_NUMBERS[tens] if tens else 1) * 10 + (_CN_NUMBERS[ones] if ones else 0)
+
+    @classmethod
+    def parse_span(cls, time_period):
+        """把“最近7天”“近十五天”“24h”这类说法转成 Timedelta，不是时间跨度时返回 None。"""
+        match = _RELATIVE_PERIOD.fullmatch(str(time_period or "").strip())
+        if not match:
+            return None
+        prefix, n, unit = match.groups()
+        if unit == "日" and not prefix:
+            return None
+        return pd.Timedelta(cls._number(n), _PERIOD_UNITS[unit.lower()])
+
+    @classmethod
+    def parse(cls, start=None, end=None, time_period=None):
+        span = None
+        if start in (None, "") and end in (None, ""):
+            span = cls.parse_span(time_period)
+        end_ts = cls._timestamp(end, "end")
+        if end_ts is not None and re.fullmatch(r"\d{4}-\d{1,2}-\d{1,2}", str(end).strip()):
+            end_ts += pd.Timedelta(days=1)
+        return cls(cls._timestamp(start, "start"), end_ts, span)
+
+    @staticmethod
+    def _timestamp(value, name):
+        if value in (None, ""):
+            return None
+        try:
+            ts = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"{name} 时间格式无效：{value}")
+        if ts is pd.NaT:
+            raise ValueError(f"{name} 时间格式无效：{value}")
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert("Asia/Shanghai").tz_localize(None)
+        return ts
+
+    def __bool__(self):
+        return self.start is not None or self.end is not None or self.span is not None
+
+    def key(self):
+        return (self.start, self.end, self.span)
+
+    def bounds(self, latest):
+        """返回 (start, end) 两个 datetime64（None 表示不限）。"""
+        if self.span is not None:
+            if latest is None:
+                return None, None
+            return np.datetime64(pd.Timestamp(latest) - self.span), None
+        start = np.datetime64(self.start) if self.start is not None else None
+        end = np.datetime64(self.end) if self.end is not None else None
+        return start, end
+
+
+# ===== 分页游标 =====
+# 游标记录数据集版本和上一页最后一行的 (热度, 行号)，翻页时二分定位，
+# 不需要重新筛选排序前面的页；数据集换版本后行号不再对应，旧游标直接拒绝
+def encode_cursor(version, heat, row):
+    raw = json.dumps({"v": version, "h": heat, "r": row}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, version):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        cursor_version, heat, row = data["v"], int(data["h"]), int(data["r"])
+    except Exception:
+        raise ValueError("cursor 无效")
+    if cursor_version != version:
+        raise ValueError("cursor 已失效：数据已更新，请从第一页重新查询")
+    return heat, row
+
+# ===== 查询结果缓存 =====
+# 仪表盘会反复发同样的 /analyze 请求：按规范化后的请求 + 数据集版本缓存结果，
+# 数据集换版本时整体清空；条目数和存活时间都可用环境变量调整
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 256))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+
+
+class ResultCache:
+    """带 TTL 的 LRU 缓存，线程安全。"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0, "expired": 0, "evicted": 0, "cleared": 0}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[0] >= self.ttl:
+                del self._items[key]
+                self.stats["expired"] += 1
+                item = None
+            if item is None:
+                self.stats["miss"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats["hit"] += 1
+            return item[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            if self._items:
+                self.stats["cleared"] += 1
+            self._items.clear()
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._items),
+                         max_size=self.max_size, ttl=self.ttl)
+        lookups = stats["hit"] + stats["miss"]
+        stats["hit_ratio"] = stats["hit"] / lookups if lookups else 0.0
+        stats["miss_ratio"] = stats["miss"] / lookups if lookups else 0.0
+        return stats
+
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+
+def request_key(platform, topic, *extra):
+    """规范化后的请求键：平台名归一、话题按 TopicQuery 规范化。"""
+    platform = platform if platform in platform_files else "all"
+    return (platform, TopicQuery.parse(topic).key()) + extra
+
+
+def result_key(dataset, platform, topic, *extra):
+    return (dataset.version,) + request_key(platform, topic, *extra)
 
 # ===== 清洗热度 =====
 def clean_hot_value(x):
@@ -68,36 +1052,173 @@ def clean_hot_value(x):
     num = re.findall(r"[\d.]+", s)
     if not num:
         return 0
-    value = float(num[0])
-    if "万" in s:
+    try:
+        value = float(num[0])
+    except ValueError:  # 例如 "1.2.3"
+        return 0
+    if "亿" in s:
+        value *= 100000000
+    elif "万" in s:
         value *= 10000
     return value
 
-# ===== 上传到 GitHub =====
-def upload_to_github(file_path, file_name):
-    with open(file_path, "rb") as f:
-        content = base64.b64encode(f.read()).decode("utf-8")
 
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Content-Type": "application/json"
-    }
+# 向量化版本，结果与逐行 clean_hot_value 完全一致：
+# 数值单元格直接取绝对值（str(x) 不会出现科学计数法的范围内，正则取到的
+# 就是它本身）；其余单元格先去重，对不同取值做一次 str.extract 取数字，
+# 再乘单位倍数后按下标展开。热度文本重复度很高，去重后只剩很小一部分。
+_NUMBER_TYPES = [int, float, np.int64, np.int32, np.float64, np.float32]
 
-    payload = {
-        "message": f"Upload {file_name}",
-        "content": content
-    }
 
-    r = requests.put(GITHUB_API_URL + file_name, json=payload, headers=headers)
+def _plain_repr(nums):
+    # float 的 str() 在 [1e-4, 1e16) 之外会变成科学计数法，需要走字符串路径
+    return (nums == 0) | ((nums >= 1e-4) & (nums < 1e16))
+
+
+def _parse_float(text):
+    try:
+        return float(text)
+    except ValueError:  # 例如 "1.2.3"
+        return np.nan
 
-    if r.status_code == 201:
-        return f"https://raw.githubusercontent.com/{GITHUB_REPO}/main/{file_name}"
+
+def clean_hot_values(s):
+    result = np.zeros(len(s))
+    notna = s.notna().to_numpy()
+
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        is_number = notna
     else:
-        raise Exception(f"上传失败：{r.json()}")
+        is_number = s.map(type).isin(_NUMBER_TYPES).to_numpy()
+    nums = np.abs(pd.to_numeric(s.where(is_number), errors="coerce").to_numpy(dtype=float))
+    fast = is_number & notna & _plain_repr(nums)
+    result[fast] = nums[fast]
+
+    rest = notna & ~fast
+    if rest.any():
+        codes, uniques = pd.factorize(s[rest])
+        text = pd.Series(uniques, dtype=object).astype(str)
+        # 用 float 而不是 pd.to_numeric 转换：\d 也匹配全角等 Unicode 数字，float 能解析
+        value = text.str.extract(r"([\d.]+)", expand=False).map(_parse_float, na_action="ignore")
+        unit = np.select(
+            [text.str.contains("亿", regex=False), text.str.contains("万", regex=False)],
+            [100000000, 10000], 1,
+        )
+        result[rest] = (value.fillna(0).to_numpy() * unit)[codes]
+    return pd.Series(result, index=s.index)
+
+
+# “<分类> <数字>”形式的原始热度（如“演出 112787”）；“…万阅读 | @…”是阅读量，不是热度
+_CATEGORY_HEAT = r"\S+\s+\d+(?:\.\d+)?"
+
+
+def heat_values(df):
+    # 微博的“热度”列是工作簿里已算好的数值，公式没算出来的行再从原始文本补，
+    # 只补“<分类> <数字>”形式的值；阅读量等其他指标保持为 0（随后被过滤掉）
+    heat = clean_hot_values(df["热度"])
+    if "热度原始数值" in df.columns:
+        raw = df["热度原始数值"]
+        missing = df["热度"].isna() & raw.astype(str).str.strip().str.fullmatch(_CATEGORY_HEAT)
+        missing &= raw.notna()
+        if missing.any():
+            heat[missing] = clean_hot_values(df.loc[missing, "热度原始数值"])
+    return heat
+
+# ===== 规范化（每个数据源版本只做一次）=====
+# 统一表结构：标题(str) 链接 时间(datetime64) 热度(int64) 平台(category)，
+# 只保留热度 > 0 的行。相同标题共用同一个字符串对象。
+PLATFORM_DTYPE = pd.CategoricalDtype(list(platform_files))
+NORMALIZE_VERSION = 2  # 规范化规则变化时递增，已持久化的数据集和导出缓存随之失效
+NORMALIZED_COLUMNS = ["标题", "链接", "时间", "热度", "平台"]
+
+
+def normalize_frame(df, platform):
+    heat = heat_values(df).round().astype("int64")
+    keep = (heat > 0).to_numpy()
+
+    codes, uniques = pd.factorize(df["标题"].fillna("").astype(str).to_numpy()[keep])
+    out = pd.DataFrame({
+        "标题": uniques.take(codes),
+        "链接": df["链接"].to_numpy()[keep] if "链接" in df.columns else None,
+        "时间": pd.to_datetime(df["时间"], errors="coerce").to_numpy()[keep],
+        "热度": heat.to_numpy()[keep],
+    })
+    out["平台"] = pd.Categorical([platform] * len(out), dtype=PLATFORM_DTYPE)
+    # 按时间排好序，时间范围查询只需二分；无法解析的时间排在最后
+    out = out.sort_values("时间", kind="stable", na_position="last", ignore_index=True)
+    return out[NORMALIZED_COLUMNS]
+
+
+# ===== 按热度取前 K 条 =====
+# K 远小于 N 时用 np.partition 找到第 K 大的热度作阈值，只对入选的行排序；
+# 无上限导出或 K 与 N 相近时退回整体排序。并列热度保持原有行顺序。
+TOPK_FULL_SORT_RATIO = 0.25
+
+
+def top_k_positions(heat, k=0):
+    n = len(heat)
+    if k <= 0 or k >= n * TOPK_FULL_SORT_RATIO:
+        order = np.argsort(-heat, kind="stable")
+        return order[:k] if k > 0 else order
+
+    kth = np.partition(heat, n - k)[n - k]
+    above = np.flatnonzero(heat > kth)
+    ties = np.flatnonzero(heat == kth)[:k - len(above)]
+    idx = np.sort(np.concatenate([above, ties]))
+    return idx[np.argsort(-heat[idx], kind="stable")]
+
+
+# ===== 上传到 GitHub =====
+# 通过 Git Data API 一次提交多个文件：内容未变的文件跳过，大文件流式上传
+def publisher():
+    return GitHubPublisher(GITHUB_REPO, GITHUB_TOKEN, branch=GITHUB_BRANCH,
+                           api_base=GITHUB_API_BASE, session=SESSION)
+
+
+def publish_exports(paths, message=None):
+    """把多个本地文件提交到仓库 exports/ 目录（一个提交），返回 {文件名: raw 链接}。"""
+    pub = publisher()
+    files = {f"exports/{os.path.basename(p)}": p for p in paths}
+    result = pub.publish(files, message or f"Upload {len(files)} export file(s)")
+    return {os.path.basename(path): pub.raw_url(path) for path in files}, result
+
+
+def upload_to_github(file_path, file_name):
+    pub = publisher()
+    pub.publish({f"exports/{file_name}": file_path}, f"Upload {file_name}")
+    return pub.raw_url(f"exports/{file_name}")
 
 
 
 #分支一：分析
+ANALYZE_MAX_LIMIT = int(os.environ.get("ANALYZE_MAX_LIMIT", 1000))
+
+
+def page_records(df):
+    records = df.assign(时间=df["时间"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+    records = records.astype(object).where(records.notna(), None)
+    return records.to_dict(orient="records")
+
+
+def analyze_result(platform, topic, time_period, limit=10, cursor=None, period=None):
+    df, errors, next_cursor = query_page(platform, topic, limit, cursor, period)
+
+    if df.empty:
+        return {"message": "没有找到相关数据。", "errors": errors, "data": [], "next_cursor": None}
+
+    mean_hot = int(df["热度"].mean())
+    summary = (
+        f"在{time_period or '最近'}，{platform} 平台的平均热度为 {mean_hot}。\n"
+        f"热门话题包括：{', '.join(df['标题'].head(5))}..."
+    )
+
+    return {
+        "message": "分析成功",
+        "raw_text": summary,
+        "data": page_records(df),
+        "next_cursor": next_cursor,
+        "errors": errors
+    }
 
 
 @app.route("/analyze", methods=["POST"])
@@ -106,87 +1227,312 @@ def analyze():
         data = request.json or {}
         platform = data.get("platform", "all")
         topic = data.get("topic", "")
-        limit = int(data.get("limit", 10))
+        # limit 限制在 [1, ANALYZE_MAX_LIMIT]，更多数据用 cursor 翻页
+        limit = min(max(int(data.get("limit", 10)), 1), ANALYZE_MAX_LIMIT)
         time_period = data.get("time_period", "")
+        cursor = data.get("cursor") or None
+        period = TimeRange.parse(data.get("start"), data.get("end"), time_period)
 
-        df = load_data(platform)
-        df["热度"] = df["热度"].apply(clean_hot_value)
-        df = df[df["热度"] > 0]
+        key = result_key(get_dataset(), platform, topic, str(time_period).strip(),
+                         period.key(), limit, cursor)
+        result = RESULT_CACHE.get(key)
+        if result is None:
+            result = analyze_result(platform, topic, time_period, limit, cursor, period)
+            RESULT_CACHE.put(key, result)
+        return jsonify(result)
 
-        if topic:
-            df = df[df["标题"].astype(str).str.contains(topic, case=False, na=False)]
+    except Exception as e:
+        return jsonify({"error": str(e)})
 
-        df = df.sort_values("热度", ascending=False).head(10)
 
-        if df.empty:
-            return jsonify({"message": "没有找到相关数据。"})
 
-        mean_hot = int(df["热度"].mean())
-        summary = (
-            f"在{time_period or '最近'}，{platform} 平台的平均热度为 {mean_hot}。\n"
-            f"热门话题包括：{', '.join(df['标题'].head(5))}..."
-        )
+#分支二：导出数据
+def prepare_export(data, progress=None):
+    """解析导出请求并选好行，返回生成导出文件所需的全部信息。
+
+    字段与 /download 相同：platform、topic、limit、cursor、start/end/time_period、
+    format、columns。格式和列在这里就校验，字节流在被迭代时才开始生成。
+    """
+    platform = data.get("platform", "all")
+    topic = data.get("topic", "")
+    limit = int(data.get("limit", 0))
+    cursor = data.get("cursor") or None
+    period = TimeRange.parse(data.get("start"), data.get("end"), data.get("time_period"))
+    fmt = data.get("format", "csv")
+    columns = data.get("columns")
+
+    # 加载数据（limit > 0 时按页导出，下一页游标放在 X-Next-Cursor 响应头）
+    dataset, rows, errors, next_cursor = query_rows(platform, topic, limit, cursor, period)
+    ext, mimetype, stream = exporters.stream_export(fmt, dataset.combined, rows, columns, progress)
+    key = request_key(platform, topic, period.key(), limit, cursor, fmt, columns)
+    return {
+        "name": EXPORT_CACHE.file_name(dataset.fingerprint, key, ext),
+        "ext": ext,
+        "mimetype": mimetype,
+        "stream": stream,
+        "rows": len(rows),
+        "errors": errors,
+        "next_cursor": next_cursor,
+    }
+
+
+@app.route("/download", methods=["POST"])
+def download_csv():
+    try:
+        export = prepare_export(request.json or {})
+        ext, mimetype = export["ext"], export["mimetype"]
+        headers = {
+            # 部分平台加载失败时通过响应头告知（平台名均为 ASCII）
+            "X-Failed-Platforms": ",".join(export["errors"]),
+            "X-Next-Cursor": export["next_cursor"] or "",
+        }
+
+        # 同样的数据和请求之前导出过：直接发送磁盘上的文件
+        path = EXPORT_CACHE.get(export["name"])
+        if path is not None:
+            response = send_file(path, mimetype=mimetype, as_attachment=True,
+                                 download_name=f"hotsearch.{ext}")
+            response.headers.update(headers)
+            return response
 
-        return jsonify({
-            "message": "分析成功",
-            "raw_text": summary
-        })
+        # 按 format 边生成边发送（默认 zip 压缩的 CSV），同时写入导出缓存
+        headers["Content-Disposition"] = f"attachment; filename=hotsearch.{ext}"
+        return Response(EXPORT_CACHE.store(export["name"], export["stream"]),
+                        mimetype=mimetype, headers=headers)
 
     except Exception as e:
         return jsonify({"error": str(e)})
 
 
+# ===== 异步导出任务 =====
+# 大导出不占用 waitress 的请求线程：POST /exports 提交后立即返回任务 id，
+# 任务在有界线程池里生成 exports/ 下的文件，客户端轮询状态后再下载。
+# 本进程排队和运行中的任务超过 EXPORT_QUEUE_LIMIT 时拒绝提交；同样的请求
+# 在进行中时直接返回已有的任务。结束的任务保留 EXPORT_JOB_TTL 秒。
+#
+# 任务记录、进行中标记和结果文件的引用都放在 exports/ 目录下（见
+# exporters.JobStore / ExportCache.pin），多个 gunicorn worker 之间共享：
+# 任意 worker 都能查询、下载、去重，也不会清理别的 worker 任务的文件。
+# 同一台机器上执行任务的进程退出后，任务被标记为失败。
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+EXPORT_QUEUE_LIMIT = int(os.environ.get("EXPORT_QUEUE_LIMIT", 16))
+EXPORT_JOB_TTL = float(os.environ.get("EXPORT_JOB_TTL", 3600))
+EXPORT_PROGRESS_INTERVAL = 0.5  # 进度写回任务记录的最短间隔（秒）
 
-#分支二：导出数据
-@app.route("/download", methods=["POST"])
-def download_csv():
+_export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_export_running = set()   # 本进程排队/运行中的任务 id
+_export_lock = threading.Lock()
+_HOST = socket.gethostname()
+EXPORT_JOBS = exporters.JobStore()
+
+
+def _job_view(job):
+    view = {k: job[k] for k in ("id", "status", "format", "rows", "progress", "error",
+                                "errors", "next_cursor", "created_at", "finished_at")}
+    if job["status"] == "done":
+        view["file"] = f"/exports/{job['id']}/file"
+    return view
+
+
+def _process_alive(job):
+    if job["host"] != _HOST or os.name == "nt":
+        return True  # 无法判断其他机器上的进程；Windows 上 os.kill 会结束进程
     try:
-        data = request.json or {}
-        platform = data.get("platform", "all")
-        topic = data.get("topic", "")
-        limit = int(data.get("limit", 0))
+        os.kill(job["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
-        # 加载数据
-        df = load_data(platform)
-        df["热度"] = df["热度"].apply(clean_hot_value)
-        df = df[df["热度"] > 0]
 
-        if topic:
-            df = df[df["标题"].astype(str).str.contains(topic, case=False, na=False)]
+def _check_job(job):
+    """执行任务的进程已经退出时把任务记为失败。"""
+    if job is not None and job["status"] in ("queued", "running") and not _process_alive(job):
+        job.update(status="failed", error="执行任务的进程已退出，请重新提交", finished_at=time.time())
+        EXPORT_JOBS.save(job)
+        EXPORT_JOBS.release(job["name"], job["id"])
+    return job
 
-        df = df.sort_values("热度", ascending=False)
 
-        if limit > 0:
-            df = df.head(limit)
+def _prune_jobs(now):
+    # 过期任务删除记录并释放对结果文件的引用（缓存关闭时文件随之删除）
+    for job in EXPORT_JOBS.all():
+        job = _check_job(job)
+        if job["finished_at"] and now - job["finished_at"] > EXPORT_JOB_TTL:
+            EXPORT_JOBS.delete(job["id"])
+            EXPORT_CACHE.unpin(job["name"], job["id"])
 
-        # 创建内存 zip
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # 把 df 写入 zip 中
-            csv_bytes = df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
-            zf.writestr("hotsearch.csv", csv_bytes)
 
-        zip_buffer.seek(0)
+def _claim(job):
+    """认领 job 的导出文件；已有进行中的任务（可能在别的 worker）时返回那个任务。"""
+    for _ in range(5):
+        holder_id = EXPORT_JOBS.claim(job["name"], job["id"])
+        if holder_id is None:
+            return None
+        if not holder_id:
+            time.sleep(0.01)  # 持有者正在写标记
+            continue
+        holder = _check_job(EXPORT_JOBS.load(holder_id))
+        if holder is not None and holder["status"] in ("queued", "running"):
+            return holder
+        # 持有者已结束或记录已过期，标记是残留的
+        EXPORT_JOBS.release(job["name"], holder_id)
+    raise Exception("导出任务状态冲突，请重试")
+
+
+def _finish_job(job):
+    job["finished_at"] = time.time()
+    EXPORT_JOBS.save(job)
+    EXPORT_JOBS.release(job["name"], job["id"])
+    with _export_lock:
+        _export_running.discard(job["id"])
+
+
+def _run_export(job, stream):
+    job["status"] = "running"
+    EXPORT_JOBS.save(job)
+    try:
+        for _ in EXPORT_CACHE.store(job["name"], stream, always=True):
+            pass
+        job.update(status="done", progress=1.0)
+    except Exception as e:
+        job.update(status="failed", error=str(e))
+    finally:
+        _finish_job(job)
 
-        # 返回 zip 文件
-        return Response(
-            zip_buffer.getvalue(),
-            mimetype="application/zip",
-            headers={
-                "Content-Disposition": "attachment; filename=hotsearch.zip"
-            }
-        )
 
+def submit_export(data):
+    job = {"id": uuid.uuid4().hex, "status": "queued", "format": data.get("format", "csv"),
+           "progress": 0.0, "error": None, "created_at": time.time(), "finished_at": None,
+           "host": _HOST, "pid": os.getpid()}
+    saved_at = [0.0]
+
+    def progress(done, total):
+        job["progress"] = round(done / total, 4) if total else 1.0
+        if job["status"] == "running" and time.time() - saved_at[0] >= EXPORT_PROGRESS_INTERVAL:
+            saved_at[0] = time.time()
+            EXPORT_JOBS.save(job)
+
+    export = prepare_export(data, progress)
+    job.update(name=export["name"], ext=export["ext"], mimetype=export["mimetype"],
+               rows=int(export["rows"]), errors=export["errors"], next_cursor=export["next_cursor"])
+
+    _prune_jobs(time.time())
+    # 先写任务记录再认领，其他 worker 看到标记时总能读到对应的任务
+    EXPORT_JOBS.save(job)
+    with _export_lock:
+        active = _claim(job)
+        if active is not None:
+            EXPORT_JOBS.delete(job["id"])
+            return active, False
+        # 任务存在期间（含完成后的 EXPORT_JOB_TTL）结果文件不会被任何 worker 淘汰
+        EXPORT_CACHE.pin(job["name"], job["id"])
+        if EXPORT_CACHE.get(job["name"]) is not None:
+            # 之前已经生成过同样的文件
+            job.update(status="done", progress=1.0)
+            _finish_job(job)
+            return job, True
+        if len(_export_running) >= EXPORT_QUEUE_LIMIT:
+            EXPORT_JOBS.release(job["name"], job["id"])
+            EXPORT_JOBS.delete(job["id"])
+            EXPORT_CACHE.unpin(job["name"], job["id"])
+            raise OverflowError(f"导出任务已满（{EXPORT_QUEUE_LIMIT} 个），请稍后再试")
+        _export_running.add(job["id"])
+    _export_pool.submit(_run_export, job, export["stream"])
+    return job, True
+
+
+@app.route("/exports", methods=["POST"])
+def create_export():
+    try:
+        job, created = submit_export(request.json or {})
+        return jsonify(dict(_job_view(job), deduplicated=not created)), 202
+    except OverflowError as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         return jsonify({"error": str(e)})
 
 
+@app.route("/exports/<job_id>", methods=["GET"])
+def export_status(job_id):
+    _prune_jobs(time.time())
+    job = _check_job(EXPORT_JOBS.load(job_id))
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(_job_view(job))
+
+
+@app.route("/exports/<job_id>/file", methods=["GET"])
+def export_file(job_id):
+    _prune_jobs(time.time())
+    job = _check_job(EXPORT_JOBS.load(job_id))
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"任务尚未完成：{job['status']}"}), 409
+    path = EXPORT_CACHE.path(job["name"])
+    if not os.path.exists(path):
+        return jsonify({"error": "导出文件已被清理，请重新提交"}), 410
+    return send_file(path, mimetype=job["mimetype"], as_attachment=True,
+                     download_name=f"hotsearch.{job['ext']}")
+
 
+# ===== 导出文件缓存 =====
+# 目录与容量上限见 exporters.EXPORT_DIR / EXPORT_CACHE_MAX_MB（0 表示不缓存）
+EXPORT_CACHE = exporters.ExportCache()
+
+
+# ===== 就绪检查 =====
+@app.route("/ready", methods=["GET"])
+def ready():
+    """有可服务的数据集时返回 200，否则在后台开始加载并返回 503。"""
+    dataset = _current_dataset
+    if dataset is None or not dataset.frames:
+        dataset = warm_start(blocking=False)
+    if dataset is None:
+        _load_in_background(get_dataset)
+        return jsonify({"ready": False}), 503
+    return jsonify({
+        "ready": True,
+        "version": dataset.version,
+        "store": dataset.store_name,
+        "age_seconds": round(time.time() - dataset.created_at, 1),
+        "revalidating": _background_loader is not None and _background_loader.is_alive(),
+        "errors": dataset.errors,
+    })
+
+
+# ===== 缓存统计 =====
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats_view():
+    return jsonify(cache_stats())
+
+
+# ===== 快照构建：python hotsearch_api.py build-snapshots [--force] =====
+def build_snapshots(base_dir=None, force=False):
+    base_dir = base_dir or DATA_DIR
+    sources = {p: (f"{p}_hotsearch.xlsx", parse_workbook) for p in platform_files}
+    for name, (file_name, encoding) in CSV_SOURCES.items():
+        sources[name] = (file_name, lambda b, enc=encoding: parse_csv(b, enc))
+
+    for name, (file_name, parse) in sources.items():
+        path = os.path.join(base_dir, file_name)
+        digest = blob_digest(path)
+        if not force and snapshot.is_current(name, digest):
+            print(f"{name}: 未变化，跳过")
+            continue
+        written = snapshot.write_snapshot(name, parse(path), digest, source=file_name)
+        print(f"{name}: 已重建，写入分区 {', '.join(written) or '无'}")
 
 
 if __name__ == "__main__":
-    from waitress import serve
-    serve(app, host="0.0.0.0", port=5000)
+    if sys.argv[1:2] == ["build-snapshots"]:
+        build_snapshots(force="--force" in sys.argv)
+    else:
+        from waitress import serve
+        warm_start()
+        serve(app, host="0.0.0.0", port=5000)
 
 
 
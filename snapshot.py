@@ -0,0 +1,196 @@
+"""列式快照（Parquet），按月分区。
+
+每个数据源在内容变化时转换一次，目录布局为：
+
+    snapshots/<name>/manifest.json     源文件 sha256 与各分区的行数、时间范围
+    snapshots/<name>/<YYYY-MM>.parquet 该月的数据（原有行序）
+    snapshots/<name>/unknown.parquet   时间无法解析的行
+
+内容哈希不变就直接读快照，按需只读部分列；带时间范围读取时只打开与之
+重叠的分区。源文件追加了新数据时只写新增或内容有变化的分区，其余分区
+原样保留。
+"""
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.environ.get(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"),
+)
+UNKNOWN_PARTITION = "unknown"
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _dir(name):
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def _manifest_path(name):
+    return os.path.join(_dir(name), "manifest.json")
+
+
+def snapshot_meta(name):
+    try:
+        with open(_manifest_path(name), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(name, digest):
+    meta = snapshot_meta(name)
+    return meta is not None and meta.get("sha256") == digest
+
+
+def latest_time(name):
+    """快照里最新的一条时间，没有快照或没有可解析的时间时返回 None。"""
+    meta = snapshot_meta(name)
+    ends = [p["end"] for p in (meta or {}).get("partitions", []) if p["end"]]
+    return pd.Timestamp(max(ends)) if ends else None
+
+
+def _arrow_safe(df):
+    # Excel 里同一列可能混着数字和文本，Parquet 要求单一类型：混合列统一转成字符串
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        kinds = {type(v) for v in df[col].dropna()}
+        if len(kinds) > 1:
+            df[col] = df[col].map(str, na_action="ignore")
+    return df
+
+
+def _times(df):
+    if "时间" not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    return pd.to_datetime(df["时间"], errors="coerce")
+
+
+def _partition_hash(part):
+    hashed = pd.util.hash_pandas_object(part, index=False).to_numpy()
+    header = json.dumps([str(c) for c in part.columns], ensure_ascii=False).encode()
+    return hashlib.sha256(header + hashed.tobytes()).hexdigest()
+
+
+def _write_atomic(path, write):
+    # 先写临时文件再替换，读者不会看到写了一半的文件
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_snapshot(name, df, digest, source=None):
+    """按月写入分区，返回实际（重新）写入的分区名列表。"""
+    directory = _dir(name)
+    os.makedirs(directory, exist_ok=True)
+    old = {p["key"]: p for p in (snapshot_meta(name) or {}).get("partitions", [])}
+
+    df = _arrow_safe(df)
+    times = _times(df)
+    keys = times.dt.strftime("%Y-%m").fillna(UNKNOWN_PARTITION)
+
+    partitions, written = [], []
+    for key, idx in sorted(keys.groupby(keys, sort=False).indices.items()):
+        part = df.iloc[idx]
+        part_hash = _partition_hash(part)
+        part_times = times.iloc[idx]
+        entry = {
+            "key": key,
+            "file": f"{key}.parquet",
+            "rows": len(part),
+            "start": None if part_times.isna().all() else part_times.min().isoformat(),
+            "end": None if part_times.isna().all() else part_times.max().isoformat(),
+            "hash": part_hash,
+        }
+        path = os.path.join(directory, entry["file"])
+        if old.get(key, {}).get("hash") != part_hash or not os.path.exists(path):
+            _write_atomic(path, lambda tmp, part=part: part.to_parquet(tmp, index=False))
+            written.append(key)
+        partitions.append(entry)
+
+    meta = {
+        "sha256": digest,
+        "source": source,
+        "rows": len(df),
+        "columns": [str(c) for c in df.columns],
+        "built_at": time.time(),
+        "partitions": partitions,
+    }
+
+    def dump(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    _write_atomic(_manifest_path(name), dump)
+
+    # 清理源数据里已经不存在的分区，以及旧版单文件快照
+    current = {p["file"] for p in partitions}
+    for key, entry in old.items():
+        if entry["file"] not in current:
+            _remove(os.path.join(directory, entry["file"]))
+    for legacy in (_dir(name) + ".parquet", _dir(name) + ".json"):
+        _remove(legacy)
+    return written
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _overlaps(entry, start, end):
+    if start is None and end is None:
+        return True
+    if entry["start"] is None:
+        return False  # 时间未知的行不参与带时间范围的读取
+    if start is not None and pd.Timestamp(entry["end"]) < start:
+        return False
+    return end is None or pd.Timestamp(entry["start"]) < end
+
+
+def read_snapshot(name, columns=None, start=None, end=None):
+    """读取快照；给出 [start, end) 时只打开时间范围重叠的分区并过滤到范围内。"""
+    meta = snapshot_meta(name)
+    if meta is None:
+        raise FileNotFoundError(f"快照不存在：{name}")
+    if columns is not None:
+        columns = [c for c in columns if c in meta["columns"]]
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    wanted = list(columns) if columns is not None else None
+    if wanted is not None and (start is not None or end is not None) and "时间" not in wanted:
+        wanted.append("时间")
+
+    parts = []
+    for entry in meta["partitions"]:
+        if not _overlaps(entry, start, end):
+            continue
+        part = pd.read_parquet(os.path.join(_dir(name), entry["file"]), columns=wanted)
+        inside_start = start is None or pd.Timestamp(entry["start"]) >= start
+        inside_end = end is None or pd.Timestamp(entry["end"]) < end
+        if not (inside_start and inside_end):
+            # 只有跨越边界的分区才需要逐行过滤
+            times = _times(part)
+            mask = times.notna()
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times < end
+            part = part[mask.to_numpy()]
+        parts.append(part)
+
+    if not parts:
+        return pd.DataFrame(columns=columns if columns is not None else meta["columns"])
+    df = pd.concat(parts, ignore_index=True)
+    return df[columns] if columns is not None else df
@@ -0,0 +1,30 @@
+"""向量化的 clean_hot_values 与逐行 clean_hot_value 结果一致。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import hotsearch_api as api
+
+EDGE_CASES = [
+    "２３", "２３万", "１.５亿", "٣٤", "１２３４５６",   # 全角、阿拉伯-印度数字
+    "1.2.3", ".", "1.", "abc", "热 0", "12万阅读", "演出 112787", "3.2亿",
+    None, float("nan"), 5, -7, 3.5, 1e20, np.int64(42), np.float32(2.5), True,
+]
+
+
+@pytest.mark.parametrize("value", EDGE_CASES, ids=repr)
+def test_single_value(value):
+    s = pd.Series([value], dtype=object)
+    assert api.clean_hot_values(s).iat[0] == float(api.clean_hot_value(value))
+
+
+def test_mixed_column():
+    s = pd.Series(EDGE_CASES * 3, dtype=object)
+    expected = s.apply(api.clean_hot_value).astype(float).to_numpy()
+    assert np.array_equal(api.clean_hot_values(s).to_numpy(), expected)
+
+
+def test_numeric_column():
+    s = pd.Series([1.0, -2.5, np.nan, 1e20, 0.1])
+    expected = s.apply(api.clean_hot_value).astype(float).to_numpy()
+    assert np.array_equal(api.clean_hot_values(s).to_numpy(), expected)
@@ -0,0 +1,122 @@
+"""start / end / time_period 时间范围：解析规则，以及在自带工作簿（2025-01-01 ~ 2025-10-31）上的筛选结果。
+
+运行：python -m pytest -q test_time_range.py（环境变量与临时目录见 conftest.py）
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import hotsearch_api as api
+from hotsearch_api import TimeRange
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    dataset = api.build_dataset(None)
+    assert not dataset.errors, dataset.errors
+    with api._dataset_lock:
+        api._swap_dataset(dataset)
+    return dataset
+
+
+def times_of(dataset, rows):
+    return pd.to_datetime(dataset.combined["时间"].to_numpy()[rows])
+
+
+def expected_rows(dataset, start=None, end=None):
+    times = pd.Series(dataset.combined["时间"].to_numpy())
+    mask = times.notna()
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times < end
+    return np.flatnonzero(mask.to_numpy())
+
+
+# ===== 解析 =====
+@pytest.mark.parametrize("text, days", [
+    ("最近7天", 7), ("近一周", 7), ("最近十五天", 15), ("十二天", 12), ("近二十天", 20),
+    ("最近二十五天", 25), ("最近12日", 12), ("24h", 1), ("last 2 weeks", 14), ("7天内", 7),
+])
+def test_relative_span(text, days):
+    assert TimeRange.parse(None, None, text).span == pd.Timedelta(days=days)
+
+
+@pytest.mark.parametrize("text", ["3月12日", "2025年3月12日", "12日", "最近", "今年春节前后", "", None])
+def test_not_a_span(text):
+    period = TimeRange.parse(None, None, text)
+    assert period.span is None
+    assert not period
+
+
+def test_date_only_end_includes_that_day():
+    period = TimeRange.parse("2025-03-01", "2025-03-05")
+    assert period.start == pd.Timestamp("2025-03-01")
+    assert period.end == pd.Timestamp("2025-03-06")
+    assert TimeRange.parse(None, "2025-03-05 12:00").end == pd.Timestamp("2025-03-05 12:00")
+
+
+def test_explicit_range_overrides_time_period():
+    period = TimeRange.parse("2025-03-01", None, "最近7天")
+    assert period.span is None and period.start == pd.Timestamp("2025-03-01")
+
+
+def test_invalid_time():
+    with pytest.raises(ValueError, match="start 时间格式无效"):
+        TimeRange.parse("明天", None)
+
+
+# ===== 自带工作簿上的筛选 =====
+def test_bundled_date_range(dataset):
+    times = times_of(dataset, np.arange(len(dataset.combined)))
+    assert times.min() >= pd.Timestamp("2025-01-01")
+    assert times.max() < pd.Timestamp("2025-11-01")
+    assert pd.Timestamp(dataset.latest).date() == pd.Timestamp("2025-10-31").date()
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2025-10-01", None),
+    (None, "2025-01-31"),
+    ("2025-03-01", "2025-03-05"),
+    ("2025-03-01 08:00", "2025-03-01 20:00"),
+    ("2025-01-01", "2025-10-31"),
+])
+def test_start_end(dataset, start, end):
+    period = TimeRange.parse(start, end)
+    rows = dataset.select_rows(None, None, period)
+    lo, hi = period.bounds(dataset.latest)
+    assert np.array_equal(np.sort(rows), expected_rows(dataset, lo, hi))
+    assert len(rows)
+
+
+def test_date_only_end_covers_last_day(dataset):
+    rows = dataset.select_rows(None, None, TimeRange.parse("2025-03-05", "2025-03-05"))
+    days = set(times_of(dataset, rows).date)
+    assert days == {pd.Timestamp("2025-03-05").date()}
+
+
+def test_full_range_keeps_every_timed_row(dataset):
+    rows = dataset.select_rows(None, None, TimeRange.parse("2025-01-01", "2025-10-31"))
+    assert len(rows) == dataset.combined["时间"].notna().sum()
+
+
+def test_relative_span_ends_at_latest(dataset):
+    rows = dataset.select_rows("weibo", None, TimeRange.parse(None, None, "最近十五天"))
+    times = times_of(dataset, rows)
+    assert times.min() >= pd.Timestamp(dataset.latest) - pd.Timedelta(days=15)
+    assert times.min() < pd.Timestamp("2025-10-17 12:00")
+
+
+def test_date_text_does_not_filter(dataset):
+    client = api.app.test_client()
+    payload = {"platform": "weibo", "topic": "王", "limit": 20}
+    plain = client.post("/analyze", json=payload).get_json()
+    dated = client.post("/analyze", json=dict(payload, time_period="3月12日")).get_json()
+    assert dated["data"] == plain["data"]
+
+
+def test_range_outside_data(dataset):
+    client = api.app.test_client()
+    result = client.post("/analyze", json={"platform": "all", "start": "2024-01-01",
+                                           "end": "2024-12-31"}).get_json()
+    assert result["data"] == []
@@ -0,0 +1,219 @@
+"""标题的字符二元组（bigram）倒排索引。
+
+中文标题没有分词边界，子串查询用字符 bigram 建倒排表：查询串的所有
+bigram 对应的倒排表求交得到候选标题，再逐个核对确实包含查询串。
+索引建在去重后的标题上，命中的标题再经 CSR 结构展开成行号，
+查询耗时只和命中数量相关，与总行数无关。
+
+构建过程全部向量化：标题按码点排成一个数组，单字和相邻两字编码成整数
+键，与标题 id 拼成一个 int64 后排序去重，即得到按键分组、组内按标题 id
+升序的倒排表。
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+_UID_BITS = 30  # 标题 id 占低 30 位，键占高位
+
+
+class TopicQuery:
+    """话题查询。
+
+    字符串按字面匹配；对象形式 {"and": [...], "or": [...], "not": [...],
+    "regex": "..."} 可任意组合，均不区分大小写。正则需要显式用 regex 给出。
+    """
+
+    def __init__(self, all_terms=(), any_terms=(), not_terms=(), regex=None):
+        self.all_terms = [t.lower() for t in all_terms if t]
+        self.any_terms = [t.lower() for t in any_terms if t]
+        self.not_terms = [t.lower() for t in not_terms if t]
+        self.regex = regex or None
+        self.pattern = None
+        if self.regex:
+            try:
+                self.pattern = re.compile(self.regex, re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"正则表达式无效：{e}")
+
+    @classmethod
+    def parse(cls, value):
+        if value is None or isinstance(value, str):
+            return cls(all_terms=[value] if value else [])
+        if not isinstance(value, dict):
+            raise ValueError("topic 必须是字符串或对象")
+        unknown = set(value) - {"and", "or", "not", "regex"}
+        if unknown:
+            raise ValueError(f"topic 不支持的字段：{', '.join(sorted(unknown))}")
+
+        def terms(key):
+            items = value.get(key) or []
+            if isinstance(items, str):
+                items = [items]
+            if not all(isinstance(t, str) for t in items):
+                raise ValueError(f"topic.{key} 必须是字符串列表")
+            return items
+
+        regex = value.get("regex")
+        if regex is not None and not isinstance(regex, str):
+            raise ValueError("topic.regex 必须是字符串")
+        return cls(terms("and"), terms("or"), terms("not"), regex)
+
+    def __bool__(self):
+        return bool(self.all_terms or self.any_terms or self.not_terms or self.regex)
+
+    def key(self):
+        """规范化后的可哈希表示，用作缓存键。"""
+        return (tuple(sorted(set(self.all_terms))), tuple(sorted(set(self.any_terms))),
+                tuple(sorted(set(self.not_terms))), self.regex)
+
+
+def _dedupe_sorted(a):
+    keep = np.empty(len(a), dtype=bool)
+    keep[:1] = True
+    np.not_equal(a[1:], a[:-1], out=keep[1:])
+    return a[keep]
+
+
+class TitleIndex:
+    ARRAYS = ("chars", "keys", "starts", "postings", "rows", "offsets")
+
+    def __init__(self, titles):
+        codes, uniques = pd.factorize(pd.Series(titles, dtype=object).fillna(""))
+        self.size = len(codes)
+        self.titles = [str(t).lower() for t in uniques]
+
+        # 码点数组，标题之间用 0 分隔；码点压缩成稠密的字符编号
+        joined = "\0".join(self.titles) + "\0"
+        cp = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        self.chars = _dedupe_sorted(np.sort(cp))  # chars[0] == 0 即分隔符
+        cid = np.searchsorted(self.chars, cp)
+        lengths = np.fromiter(map(len, self.titles), dtype=np.int64, count=len(self.titles))
+        uid = np.repeat(np.arange(len(self.titles), dtype=np.int64), lengths + 1)
+
+        real = cid != 0
+        pair = real[:-1] & real[1:]
+        keys = np.concatenate([self._unigram_key(cid[real]),
+                               self._bigram_key(cid[:-1][pair], cid[1:][pair])])
+        ids = np.concatenate([uid[real], uid[:-1][pair]])
+        packed = _dedupe_sorted(np.sort((keys << _UID_BITS) | ids))
+
+        all_keys = packed >> _UID_BITS
+        self.postings = (packed & ((1 << _UID_BITS) - 1)).astype(np.int32)
+        first = np.flatnonzero(np.concatenate(([True], all_keys[1:] != all_keys[:-1])))
+        self.keys = all_keys[first]
+        self.starts = np.append(first, len(packed))
+
+        # 标题 id -> 行号（CSR）：rows[offsets[u]:offsets[u + 1]] 是标题 u 出现的行
+        self.rows = np.argsort(codes, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques)))))
+
+    @classmethod
+    def from_arrays(cls, arrays, titles, size):
+        """由 to_arrays 的结果还原（数组可以是只读的内存映射）；titles 可以是 pyarrow 字符串数组。"""
+        index = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        index.titles = titles
+        index.size = size
+        return index
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def _titles_at(self, ids):
+        """按标题 id 取出（小写）标题文本的列表。"""
+        if isinstance(self.titles, list):
+            titles = self.titles
+            return [titles[u] for u in ids]
+        return self.titles.take(ids).to_pylist()
+
+    def _bigram_key(self, a, b):
+        return a * len(self.chars) + b
+
+    def _unigram_key(self, a):
+        return len(self.chars) ** 2 + a
+
+    def _posting(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        return self.postings[self.starts[i]:self.starts[i + 1]]
+
+    def candidates(self, text):
+        """返回可能包含 text 的标题 id（已排序），None 表示无法用索引缩小范围。"""
+        if not text:
+            return None
+        cp = np.fromiter(map(ord, text), dtype=np.int64, count=len(text))
+        cid = np.searchsorted(self.chars, cp)
+        if (cid >= len(self.chars)).any() or (self.chars[np.minimum(cid, len(self.chars) - 1)] != cp).any():
+            return np.empty(0, dtype=np.int32)  # 出现了索引里没有的字
+
+        if len(text) == 1:
+            keys = [self._unigram_key(cid[0])]
+        else:
+            keys = set(self._bigram_key(cid[:-1], cid[1:]).tolist())
+        lists = []
+        for key in keys:
+            ids = self._posting(key)
+            if ids is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(ids)
+        lists.sort(key=len)
+        result = lists[0]
+        for ids in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return result
+
+    def match_titles(self, text):
+        """包含 text（不区分大小写）的标题 id。"""
+        text = text.lower()
+        ids = self.candidates(text)
+        if ids is None:
+            return np.arange(len(self.titles), dtype=np.int32)
+        if len(text) <= 2:
+            return ids  # 倒排表本身就是精确结果
+        keep = np.fromiter((text in t for t in self._titles_at(ids)), dtype=bool, count=len(ids))
+        return ids[keep].astype(np.int32, copy=False)
+
+    def match_query(self, query):
+        """满足 TopicQuery 的标题 id。
+
+        每个关键词都由倒排表直接给出命中的标题集合，and 求交、or 求并、
+        not 求差，不需要逐词扫描整列；只有正则需要在剩余标题上过一遍。
+        """
+        ids = None
+        for term in query.all_terms:
+            found = self.match_titles(term)
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        if query.any_terms:
+            found = np.unique(np.concatenate([self.match_titles(t) for t in query.any_terms]))
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        if ids is None:
+            ids = np.arange(len(self.titles), dtype=np.int32)
+        if query.not_terms:
+            excluded = np.concatenate([self.match_titles(t) for t in query.not_terms])
+            ids = np.setdiff1d(ids, excluded, assume_unique=False)
+        if query.pattern is not None and len(ids):
+            # 正则在去重后的标题上由 pandas 的字符串方法批量判断
+            titles = pd.Series(self._titles_at(ids), dtype=object)
+            ids = ids[titles.str.contains(query.pattern, na=False).to_numpy()]
+        return ids.astype(np.int32, copy=False)
+
+    def title_rows(self, ids):
+        """标题 id 展开成升序行号。"""
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        # 把若干 [start, start + length) 区间一次性展开成下标
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        rows = self.rows[np.arange(lengths.sum()) + shift]
+        rows.sort()
+        return rows
+
+    def search(self, query):
+        """标题包含 query 的行号（升序）；query 为字符串或 TopicQuery。"""
+        if isinstance(query, str):
+            return self.title_rows(self.match_titles(query))
+        return self.title_rows(self.match_query(query))
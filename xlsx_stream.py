@@ -0,0 +1,258 @@
+"""流式 xlsx 读取。
+
+直接 iterparse 工作簿里的 sheetN.xml 和 sharedStrings.xml，只把需要的列
+写进列缓冲区，不构建 openpyxl 的对象模型。共享字符串只保留被选中列实际
+引用到的那部分，表头所在的前几条读到即停。
+"""
+import posixpath
+from array import array
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+NAN = float("nan")
+
+_ROW, _C, _V, _T, _SI, _R, _IS = (NS + t for t in ("row", "c", "v", "t", "si", "r", "is"))
+
+# 内置的日期时间格式编号（ECMA-376 18.8.30）
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(45, 48))
+_DATE_TOKENS = re.compile(r"[ymdhs]", re.I)
+_FORMAT_NOISE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+
+
+def sheet_paths(zf):
+    """按工作簿顺序返回 [(工作表名, 压缩包内路径)]。"""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {r.get("Id"): r.get("Target") for r in rels.iter(f"{PKG_REL_NS}Relationship")}
+
+    result = []
+    for sheet in workbook.iter(f"{NS}sheet"):
+        target = targets[sheet.get(f"{REL_NS}id")]
+        path = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+        result.append((sheet.get("name"), posixpath.normpath(path)))
+    return result
+
+
+def _date_styles(zf):
+    """返回数字格式为日期/时间的 cellXfs 下标集合。"""
+    try:
+        root = ET.fromstring(zf.read("xl/styles.xml"))
+    except KeyError:
+        return set()
+
+    custom = set()
+    for fmt in root.iter(f"{NS}numFmt"):
+        code = _FORMAT_NOISE.sub("", fmt.get("formatCode", ""))
+        if _DATE_TOKENS.search(code):
+            custom.add(int(fmt.get("numFmtId")))
+
+    xfs = root.find(f"{NS}cellXfs")
+    if xfs is None:
+        return set()
+    styles = set()
+    for i, xf in enumerate(xfs.iter(f"{NS}xf")):
+        fmt_id = int(xf.get("numFmtId", 0))
+        if fmt_id in _BUILTIN_DATE_FORMATS or fmt_id in custom:
+            styles.add(i)
+    return styles
+
+
+def _mark(wanted, idx):
+    if idx >= len(wanted):
+        wanted.extend(bytes(idx + 1 - len(wanted) + 4096))
+    wanted[idx] = 1
+
+
+def _shared_strings(zf, wanted):
+    """流式读取 sharedStrings.xml。
+
+    wanted 是按下标标记的 bytearray，只保留被标记的条目，读过最后一个即停；
+    返回按下标寻址的列表，未保留的位置为 None。
+    """
+    last = wanted.rfind(1)
+    strings = [None] * (last + 1)
+    if last < 0 or "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+
+    idx = 0
+    with zf.open("xl/sharedStrings.xml") as f:
+        root = None
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = el
+                continue
+            if el.tag != _SI:
+                continue
+            if wanted[idx]:
+                # 富文本由多个 <r><t> 组成；<rPh> 里的注音不属于正文
+                parts = [el.findtext(_T)] + [r.findtext(_T) for r in el.iter(_R)]
+                strings[idx] = "".join(p for p in parts if p)
+            # 已处理的 <si> 从根节点摘掉，否则空元素会一直累积
+            root.clear()
+            if idx >= last:
+                break
+            idx += 1
+    return strings
+
+
+class _Column:
+    """单列缓冲区：数值与共享字符串下标分别存进定长数组，不为每个单元格建对象。"""
+
+    def __init__(self):
+        self.nums = array("d")
+        self.refs = array("q")   # 共享字符串下标 + 1，0 表示不是共享字符串
+        self.other = {}          # 行号 -> 内联字符串、布尔等少见取值
+        self.is_date = False
+
+    def append(self, value, wanted):
+        if type(value) is float:
+            self.nums.append(value)
+            self.refs.append(0)
+            return
+        self.nums.append(NAN)
+        if type(value) is int:
+            self.refs.append(value + 1)
+            _mark(wanted, value)
+        else:
+            self.refs.append(0)
+            if value is not None:
+                self.other[len(self.refs) - 1] = value
+
+    def to_array(self, strings):
+        nums = np.frombuffer(self.nums, dtype=np.float64)
+        if self.is_date:
+            return pd.to_datetime(nums, unit="D", origin="1899-12-30").round("ms")
+        refs = np.frombuffer(self.refs, dtype=np.int64)
+        if not self.other and not refs.any():
+            return nums.copy()
+        values = nums.astype(object)
+        values[np.isnan(nums)] = None
+        lookup = np.array([None] + strings, dtype=object)
+        has_ref = refs > 0
+        values[has_ref] = lookup[refs[has_ref]]
+        for i, v in self.other.items():
+            values[i] = v
+        return values
+
+
+def _cell_value(c):
+    t = c.get("t")
+    if t == "inlineStr":
+        node = c.find(_IS)
+        return "".join(x.text or "" for x in node.iter(_T)) if node is not None else None
+    v = c.findtext(_V)
+    if not v and t != "str":
+        return None
+    if t == "s":
+        return int(v)  # 共享字符串下标，稍后统一解析
+    if t in ("str", "e"):
+        # 公式返回的空串与 pandas 一致按缺失值处理
+        return v if t == "str" and v else None
+    if t == "b":
+        return v == "1"
+    return float(v)
+
+
+def _iter_rows(zf, path):
+    """逐行产出 {列字母: (单元格值, 样式下标)}，每行处理完立即释放。"""
+    with zf.open(path) as f:
+        parent = None
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if el.tag == NS + "sheetData":
+                    parent = el
+                continue
+            if el.tag != _ROW:
+                continue
+            row = {}
+            for pos, c in enumerate(el.iter(_C)):
+                ref = c.get("r")
+                col = ref.rstrip("0123456789") if ref else pos
+                row[col] = (_cell_value(c), c.get("s"))
+            yield row
+            el.clear()
+            if parent is not None:
+                parent.clear()
+
+
+def _read_header(zf, path):
+    for row in _iter_rows(zf, path):
+        return {col: value for col, (value, _) in row.items()}
+    return {}
+
+
+def read_xlsx(source, columns=None, sheets=None, aliases=None):
+    """读取工作簿，返回 {工作表名: DataFrame}。
+
+    source 可以是路径或可 seek 的文件对象；columns 为需要的列名（按表头匹配，
+    缺失的列补空）；sheets 限定工作表名；aliases 在匹配前重命名表头。
+    """
+    aliases = aliases or {}
+    with zipfile.ZipFile(source) as zf:
+        paths = sheet_paths(zf)
+        if sheets is not None:
+            paths = [(name, path) for name, path in paths if name in sheets]
+        date_styles = _date_styles(zf)
+
+        # 第一遍：只读表头，确定每张表要保留哪些列
+        headers = {name: _read_header(zf, path) for name, path in paths}
+        wanted = bytearray()
+        for h in headers.values():
+            for v in h.values():
+                if type(v) is int:
+                    _mark(wanted, v)
+        strings = _shared_strings(zf, wanted)
+
+        buffers = {}
+        wanted = bytearray()
+        for name, path in paths:
+            header = {}
+            for col, value in headers[name].items():
+                label = strings[value] if type(value) is int else value
+                if label is None:
+                    continue
+                label = aliases.get(str(label), str(label))
+                if columns is None or label in columns:
+                    header[col] = label
+            if not header:
+                buffers[name] = ({}, 0)
+                continue
+
+            # 第二遍：把选中的列写进列缓冲区，共享字符串先以下标暂存
+            data = {label: _Column() for label in header.values()}
+            nrows = 0
+            rows = _iter_rows(zf, path)
+            next(rows, None)
+            for row in rows:
+                for col, label in header.items():
+                    value, style = row.get(col, (None, None))
+                    column = data[label]
+                    if (not column.is_date and style is not None
+                            and type(value) is float and int(style) in date_styles):
+                        column.is_date = True
+                    column.append(value, wanted)
+                nrows += 1
+            buffers[name] = (data, nrows)
+
+        # 最后一遍：只解析被引用到的共享字符串
+        strings = _shared_strings(zf, wanted)
+        del wanted
+
+    # 逐表生成 DataFrame，用完的缓冲区立即释放
+    result = {}
+    for name in list(buffers):
+        data, nrows = buffers.pop(name)
+        df = pd.DataFrame({label: data.pop(label).to_array(strings) for label in list(data)})
+        if columns is not None and nrows:
+            df = df.reindex(columns=list(columns))
+        result[name] = df
+    return result